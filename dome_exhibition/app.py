@@ -1,39 +1,192 @@
+import os
+
+# Concurrency model of the server, chosen with DOME_ASYNC_MODE:
+# 'threading' (default, one OS thread per client), 'eventlet' or 'gevent'.
+# The cooperative modes serve every phone from green threads and must patch
+# the standard library before anything else is imported.
+ASYNC_MODE = os.environ.get('DOME_ASYNC_MODE', 'threading')
+if ASYNC_MODE == 'eventlet':
+    import eventlet
+    eventlet.monkey_patch()
+elif ASYNC_MODE == 'gevent':
+    from gevent import monkey
+    monkey.patch_all()
+
+import functools
+import hmac
+import inspect
 import json
+import logging
 import socket
+import threading
 from flask_socketio import SocketIO, emit
+from flask_socketio import join_room as join_socket_room, leave_room as leave_socket_room
 from flask import Flask, render_template, jsonify, request, redirect, url_for, session
-import random
-import threading
 import time
+import uuid
+import atexit
+import dome_logging
+
+# Records go through a queue to a background writer, see dome_logging.
+# Set up before the LED and sensor modules are imported, so what they log
+# on import (e.g. the LED backend in use) goes through it as well.
+dome_logging.setup_logging()
+
+import game_store
+import leaderboard
 import led_controller
+import led_effects
+import led_renderer
+import proximity_sensor
+import room_batch
+import led_timeline
+import metrics
+from game_sessions import GameStatePool, random_code
+import sequence_codec
+import sequence_timing
+import wire_format
 
+log = logging.getLogger('app')
 
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'simon_game_secret'
 
+# --- Metrics, served at /metrics ---
+socket_event_seconds = metrics.registry.histogram(
+    'dome_socket_event_seconds', 'Time spent handling a Socket.IO event', ['event'])
+socket_emitted = metrics.registry.counter(
+    'dome_socket_emitted_total', 'Socket.IO messages emitted by the server', ['event'])
+
+
+class InstrumentedSocketIO(SocketIO):
+    """
+    SocketIO that counts every message it emits, including flask_socketio.emit().
+    Before any other event goes to a room, the room's pending room_batch is
+    sent, so batched updates never arrive after what followed them.
+    Payloads for clients that negotiated msgpack are packed (see wire_format).
+    """
+    batcher = None
+    wire = None
+
+    def emit(self, event, *args, **kwargs):
+        to = kwargs.get('to') or kwargs.get('room')
+        if event != 'room_batch' and self.batcher is not None and self.batcher.pending(to):
+            self.batcher.flush(to)
+        if self.wire is None or not args:
+            socket_emitted.inc(event)
+            return super().emit(event, *args, **kwargs)
+        kwargs.pop('room', None)
+        for target, payload in self.wire.routes(event, to, args[0]):
+            socket_emitted.inc(event)
+            kwargs['to'] = target
+            super().emit(event, payload, *args[1:], **kwargs)
+
+
 # Initialization SocketIO
-socketio = SocketIO(app, async_mode='threading', cors_allowed_origins="*")
-
-# level,light_duration_per_color,off_duration_between_colors
-level_duration_list = [
-    (1, 1, 0.5),
-    (2, 1, 0.49),
-    (3, 0.9, 0.48),
-    (4, 0.9, 0.47),
-    (5, 0.8, 0.46),
-    (6, 0.8, 0.45),
-    (7, 0.7, 0.44),
-    (8, 0.7, 0.43),
-    (9, 0.6, 0.42),
-    (10, 0.6, 0.41),
-    (11, 0.5, 0.40)
-]
+socketio = InstrumentedSocketIO(app, async_mode=ASYNC_MODE, cors_allowed_origins="*")
+# Player list changes and message box texts go out as one room_batch per window
+room_batcher = socketio.batcher = room_batch.RoomBatcher(socketio)
+# JSON for every client, msgpack payloads for those that ask for them
+wire = socketio.wire = wire_format.WireFormat()
+
+
+def socket_event(event):
+    """@socket_event(event) that also records how long the handler took."""
+    def decorator(handler):
+        # Flask-SocketIO passes extra arguments (e.g. auth on connect) when it can
+        arg_count = len(inspect.signature(handler).parameters)
+
+        @functools.wraps(handler)
+        def timed_handler(*args):
+            with socket_event_seconds.time(event):
+                return handler(*args[:arg_count])
+        return socketio.on(event)(timed_handler)
+    return decorator
+
+# One long-lived renderer owns the LED strip; game code only queues sequences.
+# In the cooperative modes its thread is a green thread, so playback waits
+# yield to the socket handlers instead of holding an OS thread.
+# After a while without players the dome runs the attract loop until the
+# next game activity (renderer.touch()) or sequence.
+renderer = led_renderer.LEDRenderer()
+renderer.set_idle_effect(led_effects.AttractLoop())
+
+
+def on_presence(present, distance_cm):
+    """A visitor walked up to (or away from) the dome."""
+    log.info("距离传感器: %s (%.0f cm)", '有人' if present else '无人', distance_cm)
+    if present:
+        renderer.prewarm()
+        renderer.wake()
+    # Only for screens that asked (watch_presence), not the players' phones
+    socketio.emit('presence', {'present': present, 'distance_cm': round(distance_cm)}, to='presence')
+
+
+# The HC-SR04 is sampled on its own thread; SENSOR_SOURCE=simulated runs
+# it without a Pi and SENSOR_SOURCE=none (the default off the Pi) disables it.
+sensor = None
+sensor_source = proximity_sensor.create_source(proximity_sensor.SENSOR_SOURCE)
+if sensor_source is not None:
+    sensor = proximity_sensor.ProximitySensor(sensor_source)
+    sensor.add_listener(on_presence)
+
+
+# High scores, games and rounds survive a restart; writes are queued and
+# committed in batches by the store's own thread. Live rooms are not restored.
+store = game_store.GameStore()
+atexit.register(store.close)
+metrics.registry.gauge('dome_store_queued_writes', 'Game store writes waiting for the next commit',
+                       lambda: store.stats()['queued'])
+
+# Live top players, updated with every score and seeded from the store.
+# Changes are pushed to the 'leaderboard' socket room as one coalesced
+# leaderboard_diff per PUSH_INTERVAL at most.
+board = leaderboard.Leaderboard()
+board.load(store.top_players(board.size))
+
+
+def push_leaderboard():
+    while True:
+        socketio.sleep(leaderboard.PUSH_INTERVAL)
+        diff = board.take_diff()
+        if diff is not None:
+            socketio.emit('leaderboard_diff', diff, to='leaderboard')
+
+
+services_started = False
+
+
+def start_services():
+    """
+    Start the renderer, the proximity sensor, the store writer and the
+    leaderboard push task. Only the process that serves the dome calls
+    this, so importing app (tests, benchmarks) never claims the strip,
+    the GPIO pins or the database.
+    """
+    global services_started
+    if services_started:
+        return
+    services_started = True
+    renderer.start()
+    if sensor is not None:
+        sensor.start()
+    store.start()
+    socketio.start_background_task(push_leaderboard)
+
 
 # ------------------ Multiplayer mode -------------------------
 user_sessions = {}
 rooms = {}
 user_sids = {}  # { username: sid }
+sid_users = {}  # { sid: username }, reverse of user_sids
+user_rooms = {}  # { username: room }
+connected_sids = set()
+
+metrics.registry.gauge('dome_active_rooms', 'Multiplayer rooms that exist', lambda: len(rooms))
+metrics.registry.gauge('dome_connected_sids', 'Connected Socket.IO clients', lambda: len(connected_sids))
+metrics.registry.gauge('dome_single_sessions', 'Single-player games in memory', lambda: len(game_states))
+metrics.registry.gauge('dome_led_queue_depth', 'LED jobs waiting for the renderer', renderer.pending)
 
 
 # Room structure example:
@@ -47,59 +200,91 @@ user_sids = {}  # { username: sid }
 #         "game_active": False,
 #         "current_level": 1,
 #         "target_sequence": [],
-#         "answers_received": {},  # { player: [sequence] }
+#         "target_code": 1,  # target_sequence packed by sequence_codec
+#         "answers_received": {},  # { player: packed answer }
 #         "all_answered": False
 #     }
 # }
-@socketio.on('connect')
-def handle_connect():
-    print("socket[connect]without data, Client connected", request.sid)
-
-
-@socketio.on('register_user')
+@socket_event('connect')
+def handle_connect(auth=None):
+    log.debug("socket[connect] Client connected", extra={'sid': request.sid})
+    connected_sids.add(request.sid)
+    game_id = session.get('game_id')
+    if game_id is not None:
+        game_sids[game_id] = request.sid
+    if wire.negotiate(request.sid, auth):
+        log.debug("客户端使用 msgpack", extra={'sid': request.sid})
+    renderer.touch()
+
+
+@socket_event('register_user')
 def handle_register_user(data):
-    print("socket[register_user]with data:", data)
+    log.debug("socket[register_user]with data: %s", data, extra={'sid': request.sid})
     username = data.get('username')
     if username:
-        user_sids[username] = request.sid
-        print(f"SID 注册成功: {username} -> {request.sid}")
+        bind_sid(username, request.sid)
+        log.info("SID 注册成功", extra={'sid': request.sid, 'username': username})
+
 
-@socketio.on('disconnect')
+def bind_sid(username, sid):
+    """Record username <-> sid in both directions, dropping any stale pairing."""
+    old_sid = user_sids.get(username)
+    if old_sid is not None:
+        sid_users.pop(old_sid, None)
+    old_username = sid_users.get(sid)
+    if old_username is not None:
+        user_sids.pop(old_username, None)
+    user_sids[username] = sid
+    sid_users[sid] = username
+
+
+def remove_player(room, username):
+    """
+    Remove a player from a room, hand the host over or delete the empty room,
+    and tell the remaining players.
+    """
+    if user_rooms.get(username) == room:
+        del user_rooms[username]
+    if room not in rooms or username not in rooms[room]['players']:
+        return
+    del rooms[room]['players'][username]
+    rooms[room]['answers_received'].pop(username, None)
+    # If it is the homeowner, update the homeowner or delete the empty room
+    if not rooms[room]['players']:
+        del rooms[room]
+        room_batcher.forget(room)
+        wire.close_room(room)
+        log.info("已删除空房间", extra={'room': room})
+        return
+    if rooms[room]['host'] == username:
+        rooms[room]['host'] = next(iter(rooms[room]['players']))
+
+    room_batcher.players(room, rooms[room]['players'], rooms[room]['host'])
+
+@socket_event('disconnect')
 def handle_disconnect():
-    print("socket[disconnect]without data,Client disconnected:", request.sid)
-    # Search for the username corresponding to this sid
-    for username, sid in user_sids.items():
-        if sid == request.sid:
-            print(f"将要删除用户 {username}")
-            for room in list(rooms.keys()):
-                if username in rooms[room]['players']:
-                    del rooms[room]['players'][username]
-                    # If it is the homeowner, update the homeowner or delete the empty room
-                    if rooms[room]['host'] == username:
-                        remaining = list(rooms[room]['players'].keys())
-                        if remaining:
-                            rooms[room]['host'] = remaining[0]
-                        else:
-                            del rooms[room]
-                            print(f"已删除空房间: {room}")
-                            break
-                socketio.emit('update_players', {
-                    'players': rooms[room]['players'],
-                    'host': rooms[room]['host']
-                })
-
-            print(f"User {username} 已从所有房间中移除")
-            user_sids.pop(username, None)
-            break
+    log.debug("socket[disconnect] Client disconnected", extra={'sid': request.sid})
+    connected_sids.discard(request.sid)
+    wire.forget(request.sid)
+    if game_sids.get(session.get('game_id')) == request.sid:
+        del game_sids[session['game_id']]
+    username = sid_users.pop(request.sid, None)
+    if username is None:
+        return
+    user_sids.pop(username, None)
+    room = user_rooms.get(username)
+    if room is not None:
+        remove_player(room, username)
+    log.info("用户已从所有房间中移除", extra={'sid': request.sid, 'username': username, 'room': room})
 
 # Join the room
-@socketio.on('join_room')
+@socket_event('join_room')
 def join_room(data):
-    print("socket[join_room]with data:", data)
+    log.debug("socket[join_room]with data: %s", data, extra={'sid': request.sid})
     username = data.get('username')
     room = data.get('room', 'default_room')
 
-    print(f"{username} 加入 {room}")
+    log.info("加入房间", extra={'sid': request.sid, 'username': username, 'room': room})
 
     if room in rooms and rooms[room]['game_active']:
         # The game has started. Joining is not allowed
@@ -108,6 +293,12 @@ def join_room(data):
         }, to=request.sid)
         return
 
+    previous_room = user_rooms.get(username)
+    if previous_room is not None and previous_room != room:
+        # A player sits in one room at a time
+        leave_socket_room(wire.room_for(request.sid, previous_room))
+        remove_player(previous_room, username)
+
     if room not in rooms:
         rooms[room] = {
             'host': username,
@@ -115,21 +306,36 @@ def join_room(data):
             'game_active': False,
             'current_level': 1,
             'target_sequence': [],
+            'target_code': sequence_codec.EMPTY_CODE,
             'answers_received': {},
             'all_answered': False
         }
 
     rooms[room]['players'][username] = {'ready': False, 'score': 0}
+    user_rooms[username] = room
+    join_socket_room(wire.room_for(request.sid, room))
+
+    # Update room information: the others get a diff, the new player the whole list
+    room_batcher.players(room, rooms[room]['players'], rooms[room]['host'])
+    if room_batcher.window:
+        socketio.emit('update_players', {
+            'players': rooms[room]['players'],
+            'host': rooms[room]['host']
+        }, to=request.sid)
 
-    # Update room information
-    socketio.emit('update_players', {
-        'players': rooms[room]['players'],
-        'host': rooms[room]['host']
-    })
+@socket_event('leave_room')
+def leave_room(data):
+    log.debug("socket[leave_room]with data: %s", data, extra={'sid': request.sid})
+    username = data.get('username')
+    room = data.get('room')
+    if room is None:
+        return
+    leave_socket_room(wire.room_for(request.sid, room))
+    remove_player(room, username)
 
-@socketio.on('set_ready')
+@socket_event('set_ready')
 def handle_set_ready(data):
-    print("socket[set_ready]with data:", data)
+    log.debug("socket[set_ready]with data: %s", data, extra={'sid': request.sid})
     username = data['username']
     room = data['room']
     if room in rooms:
@@ -137,30 +343,33 @@ def handle_set_ready(data):
         if username in room_data['players']:
             room_data['players'][username]['ready'] = True
 
-            socketio.emit('update_players', {
-                'players': rooms[room]['players'],
-                'host': rooms[room]['host']
-            })
+            room_batcher.players(room, room_data['players'], room_data['host'])
 
 
-@socketio.on('start_game')
+@socket_event('start_game')
 def handle_start_game(data):
-    print("socket[start_game]with data:", data)
-    time.sleep(1)
+    log.debug("socket[start_game]with data: %s", data, extra={'sid': request.sid})
+    renderer.touch()
+    socketio.sleep(1)
     room = data['room']
     if room in rooms:
         room_data = rooms[room]
         if room_data['host'] == data['username']:
             room_data['game_active'] = True
             room_data['current_level'] = 1
-            room_data['target_sequence'] = game_state.generate_sequence(1)
+            room_data['target_code'] = random_code(1)
+            room_data['target_sequence'] = sequence_codec.decode(room_data['target_code'])
+            room_data['game_key'] = uuid.uuid4().hex
+            room_data['answer_ms'] = {}
+            store.start_game(room_data['game_key'], 'multi', room)
 
-            threading.Thread(target=simulate_raspberry_processing_multi, args=(room,room_data['current_level'], room_data['target_sequence'],)).start()
+            simulate_raspberry_processing_multi(room, room_data['current_level'], room_data['target_sequence'])
 
             socketio.emit('game_started', {
                 'level': room_data['current_level'],
-                'sequence': room_data['target_sequence']
-            })
+                'sequence': room_data['target_code'],
+                'timeline': led_timeline.compile_level(room_data['target_code'], room_data['current_level']).to_dict()
+            }, to=room)
 
 
 def update_user_score(room, username, score_change):
@@ -172,27 +381,34 @@ def update_user_score(room, username, score_change):
     """
     if room in rooms and username in rooms[room]['players']:
         rooms[room]['players'][username]['score'] += score_change
-        socketio.emit('update_score', {
-            'username': username,
-            'score': rooms[room]['players'][username]['score']
-        })
+        board.update(username, rooms[room]['players'][username]['score'])
+        if room_batcher.window:
+            # Goes out with the other scores of the round in one room_batch
+            room_batcher.players(room, rooms[room]['players'], rooms[room]['host'])
+        else:
+            socketio.emit('update_score', {
+                'username': username,
+                'score': rooms[room]['players'][username]['score']
+            }, to=room)
 
 
-@socketio.on('submit_answer')
+@socket_event('submit_answer')
 def handle_submit_answer(data):
-    print("socket[submit_answer]with data:", data)
+    log.debug("socket[submit_answer]with data: %s", data, extra={'sid': request.sid})
+    renderer.touch()
     username = data['username']
     room = data['room']
     answer = data['answer']
 
     if room in rooms:
         room_data = rooms[room]
-        room_data['answers_received'][username] = answer
+        room_data['answers_received'][username] = sequence_codec.to_code(answer)
+        if room_data.get('input_opened_at') is not None:
+            room_data.setdefault('answer_ms', {})[username] = \
+                (time.monotonic() - room_data['input_opened_at']) * 1000
 
         if len(room_data['answers_received']) == len(room_data['players']):
-            socketio.emit('write_messageBox', {
-                'message': 'Observe the light!'
-            })
+            room_batcher.message(room, 'Observe the light!')
             evaluate_all_answers(room)
         else:
             socketio.emit('write_messageBox', {
@@ -201,60 +417,131 @@ def handle_submit_answer(data):
 
 def evaluate_all_answers(room):
     room_data = rooms[room]
-    correct_sequence = room_data['target_sequence']
+    correct_code = room_data['target_code']
 
     for user, ans in room_data['answers_received'].items():
-        if ans == correct_sequence:
-            room_data['players'][user]['score'] += 10 + (room_data['current_level'] * 10)
-            update_user_score(room, user, room_data['players'][user]['score'])
-        else:
-            pass
+        if ans == correct_code:
+            update_user_score(room, user, 10 + (room_data['current_level'] * 10))
+        if user in room_data['players']:
+            store.record_round(room_data.get('game_key'), user, room_data['current_level'], ans == correct_code,
+                               room_data['players'][user]['score'], room_data.get('answer_ms', {}).get(user))
 
     room_data['current_level'] += 1
     room_data['answers_received'] = {}
+    room_data['answer_ms'] = {}
 
     if room_data['current_level'] > 5:
         end_game(room)
     else:
-        time.sleep(1)
-        print("[evaluate_all_answers]进入第{0}关".format(room_data['current_level']))
-        next_seq = game_state.generate_sequence(room_data['current_level'])
+        socketio.sleep(1)
+        log.info("[evaluate_all_answers]进入下一关",
+                 extra={'room': room, 'game_level': room_data['current_level']})
+        room_data['target_code'] = random_code(room_data['current_level'])
+        next_seq = sequence_codec.decode(room_data['target_code'])
         room_data['target_sequence'] = next_seq
-        threading.Thread(target=simulate_raspberry_processing_multi, args=(room,room_data['current_level'], next_seq,)).start()
+        simulate_raspberry_processing_multi(room, room_data['current_level'], next_seq)
 
 
 def end_game(room):
-    print("[end_game]游戏结束")
+    log.info("[end_game]游戏结束", extra={'room': room})
     room_data = rooms[room]
     socketio.emit('game_over', {
         'scores': {u: p['score'] for u, p in room_data['players'].items()}
-    })
-
+    }, to=room)
+    if room_data.get('game_key') is not None:
+        max_level = room_data['current_level'] - 1
+        store.end_game(room_data['game_key'],
+                       {u: (p['score'], max_level) for u, p in room_data['players'].items()})
+
+    for username in room_data['players']:
+        if user_rooms.get(username) == room:
+            del user_rooms[username]
     if room in rooms:
         del rooms[room]
+    room_batcher.forget(room)
+    socketio.close_room(room)
+    binary_room = wire.close_room(room)
+    if binary_room is not None:
+        socketio.close_room(binary_room)
+
+
+@socket_event('watch_leaderboard')
+def handle_watch_leaderboard():
+    """Subscribe to leaderboard_diff; the reply (ack) is the board to apply them to."""
+    join_socket_room(wire.room_for(request.sid, 'leaderboard'))
+    return board.snapshot()
+
+
+@socket_event('watch_presence')
+def handle_watch_presence():
+    """Subscribe to presence events (attract or leaderboard screens); the ack is the sensor state."""
+    join_socket_room(wire.room_for(request.sid, 'presence'))
+    return sensor.stats() if sensor is not None else None
+
+
+# Seconds between fixing the start of a sequence and its first LED edge, so
+# 'sequence_playing' reaches the phones before the dome lights up
+PLAYBACK_LEAD = 0.3
+# Seconds past the end of its sequence a request without a socket waits
+# for the renderer before answering anyway
+PLAYBACK_WAIT_MARGIN = 5.0
 
 
+@socket_event('clock_sync')
+def handle_clock_sync(data):
+    """NTP-style probe from static/js/dome_clock.js; the reply is the ack."""
+    received = sequence_timing.server_time_ms()
+    return {'t0': data.get('t0'), 't1': received, 't2': sequence_timing.server_time_ms()}
+
+
+def play_level_sequence(level, sequence, on_done, to=None):
+    """
+    Queue the sequence on the LED renderer with the timing of the given level.
+    on_done runs once the dome has finished showing it. If the renderer queue
+    is full the lights are skipped so the players are never left waiting.
+    When to (a room or sid) is given, it gets 'sequence_playing' as soon as
+    the start is fixed, with start_at/end_at in the server clock, so the
+    phones can animate with the dome and open input when the LEDs finish.
+    """
+    code = sequence_codec.encode(sequence)
+    timeline = led_timeline.compile_level(code, level)
+    on_start = None
+    if to is not None:
+        def on_start(job):
+            socketio.emit('sequence_playing', {
+                'level': level,
+                'sequence': code,
+                'start_at': sequence_timing.server_time_ms(job.started_at),
+                'end_at': sequence_timing.server_time_ms(job.started_at + timeline.duration),
+                'timeline': timeline.to_dict()
+            }, to=to)
+    if not renderer.submit_timeline(timeline, on_done=lambda job: on_done(), name=str(sequence),
+                                    on_start=on_start, lead=PLAYBACK_LEAD):
+        log.warning("LED渲染队列已满, 跳过序列: %s", sequence)
+        on_done()
 
 
 # Raspberry PI processing simulation
 def simulate_raspberry_processing_multi(room, level, sequence):
     # Playback sequence
-    led_controller.play_sequence(sequence, light_duration_per_color=level_duration_list[level-1][1], off_duration_between_colors=level_duration_list[level-1][2])
+    play_level_sequence(level, sequence, lambda: on_sequence_played_multi(room, sequence), to=room)
+
 
-    # led_controller.play_sequence(sequence, light_duration_per_color=0.8, off_duration_between_colors=0.2)
-    print(f"树莓派序列处理完成: {sequence}")
+def on_sequence_played_multi(room, sequence):
+    log.debug("树莓派序列处理完成: %s", sequence, extra={'room': room})
     if room not in rooms:
-        print("[simulate_raspberry_processing_multi]房间不存在")
+        log.warning("[simulate_raspberry_processing_multi]房间不存在", extra={'room': room})
         return
     room_data = rooms[room]
+    # Answer times are measured from here
+    room_data['input_opened_at'] = time.monotonic()
 
     # Notify the front end: The Raspberry PI has completed the sequence display and can now start inputting
     notify_frontend({
         'status': 'ready_for_input',
         'level': room_data['current_level'],
-        'sequence': sequence
-    })
-
+        'sequence': sequence_codec.encode(sequence)
+    }, to=room)
 
 
 # -------------------------- Home Page --------------------------
@@ -273,6 +560,7 @@ def save_username():
 
     session['username'] = username
     user_sessions[username] = {'score': 0, 'level': 1}
+    store.record_player(username)
 
     return jsonify({
         'status': 'success',
@@ -302,13 +590,17 @@ def select_mode():
 @app.route('/single')
 def single_player():
     username = session.get('username', 'tourist')
-    return render_template('single.html', player_name=username, game_mode='single')
+    # The page's socket connects with this cookie, see game_sid()
+    session_game_id()
+    return render_template('single.html', player_name=username, game_mode='single',
+                           palette=sequence_codec.PALETTE)
 
 
 @app.route('/multi')
 def multi_player():
     username = session.get('username', 'tourist')
-    return render_template('multi.html', player_name=username, game_mode='multi')
+    return render_template('multi.html', player_name=username, game_mode='multi',
+                           palette=sequence_codec.PALETTE)
     # return f"欢迎 {username} 进入【多人模式】页面！"
 
 @app.route('/')
@@ -317,86 +609,112 @@ def index():
 
 # ---------------------------- Single-player mode ---------------------------------
 
-class GameState:
-    def __init__(self):
-        self.current_level = 1
-        self.target_sequence = []
-        self.player_sequence = []
-        self.player_score = 0
-        self.game_active = False
-
-    def generate_sequence(self, level=None):
-        """Generate a new color sequence"""
-        level = level or self.current_level
-        colors = ['red', 'blue', 'green', 'yellow']
-        seq_length = min(2 + level, 10) 
-        self.target_sequence = random.choices(colors, k=seq_length)
-        print("生成新序列:", self.target_sequence)
-        self.player_sequence = []
-        return self.target_sequence
-
-    def reset_game(self):
-        """Reset the game status"""
-        self.current_level = 1
-        self.player_score = 0   
-        self.game_active = False
-        self.target_sequence = []
-        self.player_sequence = []
-
-    def check_sequence(self, player_sequence):
-        """Verify the player sequence and update the score"""
-        print("对比玩家输入序列:", player_sequence)
-        print("目标序列:", self.target_sequence)
-        if player_sequence == self.target_sequence:
-            # Calculate the score: base score + level bonus
-            self.player_score += 10 + (self.current_level * 10)
-            self.current_level += 1
-            return True
-        self.game_active = False
-        return False
-
-game_state = GameState()
+# Every browser session gets its own GameState
+game_states = GameStatePool()
+game_sids = {}  # { game_id: sid } of the last socket each session connected
+
+
+def session_game_id():
+    """game_id of the Flask session making this request, created on first use."""
+    game_id = session.get('game_id')
+    if game_id is None:
+        game_id = uuid.uuid4().hex
+        session['game_id'] = game_id
+    return game_id
+
+
+def current_game_state():
+    """Return the GameState of the Flask session making this request."""
+    return game_states.get(session_game_id())
+
+
+def game_sid(sid):
+    """
+    Socket to send the game updates of this request to: the sid the page
+    sent if that client is connected, else the socket its session last
+    connected (pages that send no sid). None if the page has no socket.
+    """
+    if sid in connected_sids:
+        return sid
+    return game_sids.get(session.get('game_id'))
+
+
+@app.before_request
+def wake_dome():
+    # Any single-player game request counts as activity for the attract loop
+    if request.path.startswith('/api/game/'):
+        renderer.touch()
 
 
 # API endpoint implementation
 @app.route('/api/game/start', methods=['POST'])
 def start_game():
     """Start a new game"""
+    game_state = current_game_state()
     game_state.reset_game()
     game_state.game_active = True
     sequence = game_state.generate_sequence()
-
-    time.sleep(1)
+    data = request.get_json(silent=True) or {}
+    sid = game_sid(data.get('sid'))
+    name = session.get('username') or data.get('playerName')
+    # Visitors who did not save a name ('tourist' is the page's placeholder)
+    # play unranked: their games are neither stored nor put on the board,
+    # otherwise they would all merge into one 'tourist' player
+    game_state.player_name = name if name and name != 'tourist' else None
+    game_state.game_key = uuid.uuid4().hex if game_state.player_name else None
+    game_state.input_opened_at = None
+    if game_state.game_key is not None:
+        store.start_game(game_state.game_key, 'single')
+
+    socketio.sleep(1)
 
     # Simulate the processing thread of Raspberry PI
-    threading.Thread(target=simulate_raspberry_processing, args=(game_state.current_level, sequence,)).start()
+    update = simulate_raspberry_processing(game_state, game_state.current_level, sequence, sid)
 
-    return jsonify({
+    response = {
         'status': 'started',
         'level': game_state.current_level,
-        'sequence': sequence,
+        'sequence': game_state.target_code,
+        'timeline': led_timeline.compile_level(game_state.target_code, game_state.current_level).to_dict(),
         'score': game_state.player_score
-    })
+    }
+    if update is not None:
+        response['game_update'] = update
+    return jsonify(response)
 
 
 @app.route('/api/game/check', methods=['POST'])
 def check_sequence():
     """Verify the sequence input by the player"""
+    game_state = current_game_state()
     if not game_state.game_active:
         return jsonify({'error': 'Game not active'}), 400
 
     data = request.json
     player_sequence = data.get('playerSequence', [])
-
-    if game_state.check_sequence(player_sequence):
+    level = game_state.current_level
+    answer_ms = None
+    if game_state.input_opened_at is not None:
+        answer_ms = (time.monotonic() - game_state.input_opened_at) * 1000
+
+    correct = game_state.check_sequence(player_sequence)
+    # Both store calls do nothing for unranked games (no game_key)
+    store.record_round(game_state.game_key, game_state.player_name, level, correct,
+                       game_state.player_score, answer_ms)
+    if correct:
+        if game_state.player_name is not None:
+            board.update(game_state.player_name, game_state.player_score)
         return jsonify({
             'result': 'correct',
             'score': game_state.player_score,
             'nextLevel': game_state.current_level
         })
     else:
+        store.end_game(game_state.game_key, {game_state.player_name:
+                                             (game_state.player_score, game_state.current_level - 1)})
         return jsonify({
             'result': 'incorrect',
+            'first_mismatch': game_state.first_mismatch,
             'final_score': game_state.player_score,
             'max_level': game_state.current_level - 1
         })
@@ -405,43 +723,144 @@ def check_sequence():
 @app.route('/api/game/sequence', methods=['GET'])
 def get_sequence():
     """Get the new sequence of the specified level"""
-    time.sleep(1)
+    game_state = current_game_state()
+    socketio.sleep(1)
 
     level = request.args.get('level', type=int, default=game_state.current_level)
     sequence = game_state.generate_sequence(level)
+    sid = game_sid(request.args.get('sid'))
 
-    threading.Thread(target=simulate_raspberry_processing, args=(level, sequence,)).start()
+    update = simulate_raspberry_processing(game_state, level, sequence, sid)
 
-    return jsonify({
-        'sequence': sequence,
+    response = {
+        'sequence': game_state.target_code,
+        'timeline': led_timeline.compile_level(game_state.target_code, level).to_dict(),
         'level': level
-    })
+    }
+    if update is not None:
+        response['game_update'] = update
+    return jsonify(response)
 
 
 @app.route('/api/game/reset', methods=['POST'])
 def reset_game():
     """Reset the game status"""
-    game_state.reset_game()
+    current_game_state().reset_game()
     return jsonify({'status': 'reset', 'score': 0, 'level': 1})
 
-def simulate_raspberry_processing(level, sequence):
+@app.route('/api/leaderboard', methods=['GET'])
+def leaderboard_api():
+    """Best players of all time from the game store"""
+    limit = max(1, min(request.args.get('limit', type=int, default=game_store.LEADERBOARD_SIZE), 100))
+    return jsonify({'players': store.top_players(limit)})
 
-    led_controller.play_sequence(sequence, light_duration_per_color=level_duration_list[level-1][1], off_duration_between_colors=level_duration_list[level-1][2])
-    print(f"树莓派序列处理完成: {sequence}")
 
-    notify_frontend({
+@app.route('/api/led/timing', methods=['GET'])
+def led_timing():
+    """How late the LED edges fired and how many frame writes were skipped"""
+    timing = renderer.jitter.snapshot()
+    timing['frames'] = led_controller.frame_stats()
+    return jsonify(timing)
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Counters and histograms of the game and LED subsystems, Prometheus text format"""
+    return app.response_class(metrics.registry.render(), content_type=metrics.CONTENT_TYPE)
+
+
+@app.route('/api/sensor', methods=['GET'])
+def sensor_status():
+    """Filtered distance and presence from the proximity sensor"""
+    if sensor is None:
+        return jsonify({'error': 'No proximity sensor'}), 404
+    return jsonify(sensor.stats())
+
+
+# --- Operator Configuration ---
+# Operator controls (changing the brightness) are not for the visitors on
+# the same access point: they need DOME_ADMIN_TOKEN in the X-Dome-Token
+# header, or without a token configured must come from the Pi itself.
+ADMIN_TOKEN = os.environ.get('DOME_ADMIN_TOKEN')
+
+
+def is_operator():
+    """True if the request may use the operator controls."""
+    if ADMIN_TOKEN:
+        return hmac.compare_digest(request.headers.get('X-Dome-Token', ''), ADMIN_TOKEN)
+    return request.remote_addr in ('127.0.0.1', '::1')
+
+
+@app.route('/api/led/brightness', methods=['GET', 'POST'])
+def led_brightness():
+    """Read or change (operators only) the global LED brightness (0-255), e.g. for night mode"""
+    if request.method == 'POST':
+        if not is_operator():
+            log.warning("拒绝修改亮度: %s", request.remote_addr)
+            return jsonify({'error': 'operator access required'}), 403
+        data = request.get_json(silent=True) or {}
+        try:
+            brightness = int(data['brightness'])
+        except (KeyError, TypeError, ValueError):
+            return jsonify({'error': 'brightness must be an integer 0-255'}), 400
+        led_controller.set_brightness(brightness)
+    return jsonify(led_controller.output_correction.stats())
+
+
+def simulate_raspberry_processing(game_state, level, sequence, sid=None):
+    """
+    Play the sequence on the dome. The page with the given sid gets
+    'ready_for_input' once the dome is done. Without a sid there is no
+    socket to tell: this waits for the dome and returns that update for
+    the HTTP response instead.
+    """
+    if sid is not None:
+        play_level_sequence(level, sequence, lambda: on_sequence_played(game_state, sequence, sid), to=sid)
+        return None
+    played = threading.Event()
+    play_level_sequence(level, sequence, played.set)
+    duration = led_timeline.compile_level(sequence_codec.encode(sequence), level).duration
+    if not played.wait(PLAYBACK_LEAD + duration + PLAYBACK_WAIT_MARGIN):
+        log.warning("等待LED序列超时: %s", sequence)
+    return on_sequence_played(game_state, sequence)
+
+
+def on_sequence_played(game_state, sequence, sid=None):
+    log.debug("树莓派序列处理完成: %s", sequence, extra={'sid': sid})
+    game_state.input_opened_at = time.monotonic()
+
+    message = {
         'status': 'ready_for_input',
         'level': game_state.current_level,
-        'sequence': sequence
-    })
+        'sequence': sequence_codec.encode(sequence)
+    }
+    if sid is not None:
+        notify_frontend(message, to=sid)
+    return message
 
-def notify_frontend(message):
-    """Send real-time notifications to the front end via WebSocket"""
-    socketio.emit('game_update', message)
-    print(f"已通过WebSocket发送通知到前端: {message}")
+def notify_frontend(message, to=None):
+    """
+    Send real-time notifications to the front end via WebSocket
+    to is a room name or a single sid. Without one (a client that did not
+    send its sid) the notification is dropped: a broadcast would reach the
+    phones of every other game.
+    """
+    if to is None:
+        log.warning("没有sid或房间, 丢弃通知: %s", message)
+        return
+    socketio.emit('game_update', message, to=to)
+    log.debug("已通过WebSocket发送通知到前端: %s", message, extra={'room': to})
 
 
 if __name__ == '__main__':
+    port = int(os.environ.get('DOME_PORT', '5000'))
     # threading.Thread(target=start_socket_server, daemon=True).start()
     # app.run(host='0.0.0.0', port=5001, debug=True)
-    socketio.run(app, host='0.0.0.0', port=5000, allow_unsafe_werkzeug = True, debug = True)
+    start_services()
+    # No debug reloader: its parent process would import app as well and
+    # drive the same strip and sensor as the server process
+    if ASYNC_MODE == 'threading':
+        socketio.run(app, host='0.0.0.0', port=port, allow_unsafe_werkzeug = True)
+    else:
+        # eventlet/gevent bring their own production WSGI server
+        socketio.run(app, host='0.0.0.0', port=port)
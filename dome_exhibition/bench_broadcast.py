@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Socket.IO fan-out benchmark
+Plays the multiplayer lobby flow (join, ready, start, score, game over) for
+several rooms with the Flask-SocketIO test client and counts how many
+messages each event delivered. The "broadcast" column is what the same
+emits cost when every event went to every connected client.
+
+    python3 bench_broadcast.py --rooms 10 --players 4
+"""
+
+import argparse
+from collections import Counter
+
+import app as server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Count Socket.IO messages per event")
+    parser.add_argument('--rooms', type=int, default=10)
+    parser.add_argument('--players', type=int, default=4, help="players per room")
+    args = parser.parse_args()
+
+    # Count every emit made by the server, whatever its target
+    emitted = Counter()
+    original_emit = server.socketio.emit
+
+    def counting_emit(event, *a, **kw):
+        emitted[event] += 1
+        return original_emit(event, *a, **kw)
+
+    server.socketio.emit = counting_emit
+
+    clients = []
+    for r in range(args.rooms):
+        room = f"bench_room_{r}"
+        for p in range(args.players):
+            username = f"bench_{r}_{p}"
+            client = server.socketio.test_client(server.app)
+            client.emit('register_user', {'username': username})
+            client.emit('join_room', {'username': username, 'room': room})
+            clients.append((client, username, room))
+
+    for client, username, room in clients:
+        client.emit('set_ready', {'username': username, 'room': room})
+
+    for r in range(args.rooms):
+        room = f"bench_room_{r}"
+        client, username, _ = clients[r * args.players]
+        client.emit('start_game', {'username': username, 'room': room})
+        for _, player, _ in clients[r * args.players:(r + 1) * args.players]:
+            server.update_user_score(room, player, 10)
+        with server.app.test_request_context():
+            server.end_game(room)
+
+    delivered = Counter()
+    for client, _, _ in clients:
+        for message in client.get_received():
+            delivered[message['name']] += 1
+        client.disconnect()
+
+    total_clients = len(clients)
+    print(f"=== {args.rooms} rooms x {args.players} players ({total_clients} clients) ===")
+    print(f"{'event':<16}{'emits':>8}{'delivered':>12}{'broadcast':>12}")
+    for event in sorted(emitted):
+        print(f"{event:<16}{emitted[event]:>8}{delivered[event]:>12}{emitted[event] * total_clients:>12}")
+    print(f"{'total':<16}{sum(emitted.values()):>8}{sum(delivered.values()):>12}"
+          f"{sum(emitted.values()) * total_clients:>12}")
+    server.renderer.stop()
+
+
+if __name__ == "__main__":
+    main()
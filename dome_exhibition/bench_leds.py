@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+Microbenchmarks of the LED and game logic hot paths
+Times light_zone, turn_off_zone, turn_off_all_leds, play_sequence (sleeps
+stubbed out), GameState.generate_sequence / check_sequence and
+evaluate_all_answers against the dummy and the simulator backends, plus
+the JSON / msgpack encoding of a sequence_playing payload, and writes the
+results as JSON so two commits can be compared:
+
+    python3 bench_leds.py --output before.json
+    python3 bench_leds.py --output after.json --compare before.json
+
+evaluate_all_answers needs the server dependencies (Flask-SocketIO); it is
+left out when app.py cannot be imported.
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+import types
+
+import game_sessions
+import led_controller
+import led_effects
+import led_timeline
+import sequence_codec
+import sequence_timing
+import wire_format
+
+BACKENDS = ('dummy', 'simulator')
+SEQUENCE = ['red', 'blue', 'yellow', 'green', 'red', 'green']
+
+
+def measure(fn, repeat):
+    """Run fn in batches of about 0.1 s; return per-call timings in microseconds."""
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()
+    runs = [t / number * 1000000 for t in timer.repeat(repeat=repeat, number=number)]
+    return {
+        'min_us': round(min(runs), 3),
+        'median_us': round(statistics.median(runs), 3),
+        'calls_per_run': number,
+        'ops_per_s': round(1000000 / min(runs), 1)
+    }
+
+
+def led_benchmarks():
+    """
+    Benchmarks of led_controller. Each one first puts the buffer back in a
+    state where the call has something to change (a cheap slice fill), so
+    the delta push does not skip the write.
+    """
+    framebuffer = led_controller.framebuffer
+    zones = sequence_codec.PALETTE
+    calls = {'n': 0}
+
+    def next_zone():
+        calls['n'] += 1
+        return zones[calls['n'] % len(zones)]
+
+    def light_zone():
+        framebuffer.clear()
+        led_controller.light_zone(next_zone(), 0)
+
+    def turn_off_zone():
+        zone_name = next_zone()
+        framebuffer.fill_runs(led_controller.ZONES[zone_name], led_controller.RED_COLOR)
+        led_controller.turn_off_zone(zone_name)
+
+    def turn_off_all_leds():
+        framebuffer.fill(0, led_controller.LED_COUNT, led_controller.RED_COLOR)
+        led_controller.turn_off_all_leds()
+
+    def push_unchanged():
+        framebuffer.push(led_controller.strip)
+
+    def play_sequence():
+        led_controller.play_sequence(SEQUENCE, 0.8, 0.2)
+
+    chase = led_effects.RainbowChase()
+    pulse = led_effects.Pulse()
+
+    def effect_frame():
+        # One 60 FPS tick of the attract loop: render and push
+        calls['n'] += 1
+        t = calls['n'] / 60
+        led_controller.show_pixels(chase.render(t) if calls['n'] % 2 else pulse.render(t))
+
+    return {
+        'light_zone': light_zone,
+        'turn_off_zone': turn_off_zone,
+        'turn_off_all_leds': turn_off_all_leds,
+        'push_unchanged': push_unchanged,
+        'play_sequence': play_sequence,
+        'effect_frame': effect_frame,
+    }
+
+
+def game_benchmarks():
+    state = game_sessions.GameState()
+
+    def generate_sequence():
+        state.generate_sequence(8)
+
+    def check_sequence():
+        state.game_active = True
+        state.check_sequence(state.target_code)
+
+    def check_sequence_list():
+        state.game_active = True
+        state.check_sequence(state.target_sequence)
+
+    state.generate_sequence(8)
+    return {
+        'generate_sequence': generate_sequence,
+        'check_sequence': check_sequence,
+        'check_sequence_list': check_sequence_list,
+    }
+
+
+def wire_benchmarks():
+    """Encoding a sequence_playing payload as JSON and, when installed, as msgpack."""
+    code = game_sessions.random_code(5)
+    payload = {'level': 5, 'sequence': code, 'start_at': 123456.7, 'end_at': 129876.5,
+               'timeline': led_timeline.compile_level(code, 5).to_dict()}
+    sizes = {'json': len(json.dumps(payload))}
+    benchmarks = {'encode_json': lambda: json.dumps(payload)}
+    if wire_format.msgpack is not None:
+        sizes['msgpack'] = len(wire_format.WireFormat.encode(payload))
+        benchmarks['encode_msgpack'] = lambda: wire_format.WireFormat.encode(payload)
+    print(f"sequence_playing payload bytes: {sizes}", file=sys.stderr)
+    return benchmarks
+
+
+def server_benchmarks():
+    """evaluate_all_answers on a four-player room, without the LED playback and waits."""
+    # Scores go to a throwaway store, not dome.sqlite3 and its leaderboard,
+    # and the sensor stays off (app's services are never started here)
+    os.environ['DOME_DB_PATH'] = os.path.join(tempfile.mkdtemp(), 'bench.sqlite3')
+    os.environ['SENSOR_SOURCE'] = 'none'
+    try:
+        import app as server
+    except ImportError as e:
+        print(f"Skipping evaluate_all_answers: {e}", file=sys.stderr)
+        return {}
+    server.renderer.set_idle_effect(None)
+    server.socketio.sleep = lambda seconds=0: None
+    server.play_level_sequence = lambda level, sequence, on_done, to=None: None
+    players = [f"bench_{i}" for i in range(4)]
+
+    def evaluate_all_answers():
+        code = game_sessions.random_code(3)
+        server.rooms['bench_room'] = {
+            'host': players[0],
+            'players': {name: {'ready': True, 'score': 0} for name in players},
+            'game_active': True,
+            'current_level': 3,
+            'target_sequence': sequence_codec.decode(code),
+            'target_code': code,
+            'answers_received': {name: code if i % 2 else code ^ 1 for i, name in enumerate(players)},
+            'all_answered': True
+        }
+        server.evaluate_all_answers('bench_room')
+
+    return {'evaluate_all_answers': evaluate_all_answers}
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline_path, threshold):
+    """Print the change of every benchmark against an earlier JSON report."""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    print(f"\n=== Compared with {baseline_path} ({baseline['meta'].get('commit')}) ===")
+    regressions = 0
+    for backend, benchmarks in results.items():
+        for name, result in benchmarks.items():
+            old = baseline['results'].get(backend, {}).get(name)
+            if old is None:
+                continue
+            ratio = result['min_us'] / old['min_us']
+            flag = ''
+            if ratio > 1 + threshold:
+                flag = '  <-- slower'
+                regressions += 1
+            print(f"{backend:>10} {name:<22} {old['min_us']:10.2f} -> {result['min_us']:10.2f} us "
+                  f"({ratio:5.2f}x){flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="LED and game logic microbenchmarks")
+    parser.add_argument('--backend', choices=BACKENDS, action='append',
+                        help="backend to run against, repeatable (default: all)")
+    parser.add_argument('--repeat', type=int, default=5, help="timed runs per benchmark")
+    parser.add_argument('--output', help="write the JSON report to this file (default: stdout)")
+    parser.add_argument('--compare', help="earlier JSON report to compare with")
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help="slowdown counted as a regression with --compare (0.10 = 10%%)")
+    args = parser.parse_args()
+
+    # No real waiting: play_sequence and light_zone return as soon as they have drawn
+    sequence_timing.sleep_until = lambda deadline: None
+    led_controller.time = types.SimpleNamespace(
+        sleep=lambda seconds: None, monotonic=time.monotonic, perf_counter=time.perf_counter)
+
+    server = server_benchmarks()
+    server.update(wire_benchmarks())
+    results = {}
+    for backend in args.backend or BACKENDS:
+        led_controller.set_backend(backend)
+        benchmarks = dict(led_benchmarks())
+        benchmarks.update(game_benchmarks())
+        benchmarks.update(server)
+        results[backend] = {}
+        for name, fn in benchmarks.items():
+            results[backend][name] = measure(fn, args.repeat)
+            print(f"{backend:>10} {name:<22} {results[backend][name]['min_us']:10.2f} us",
+                  file=sys.stderr)
+
+    report = {
+        'meta': {
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'led_count': led_controller.LED_COUNT
+        },
+        'results': results
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+    if args.compare:
+        regressions = compare(results, args.compare, args.threshold)
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,11 @@
+"""
+Test settings, applied before any test module imports the server modules:
+a throwaway game store and no LED or sensor hardware.
+"""
+
+import os
+import tempfile
+
+os.environ['DOME_DB_PATH'] = os.path.join(tempfile.mkdtemp(), 'dome.sqlite3')
+os.environ.setdefault('LED_BACKEND', 'dummy')
+os.environ.setdefault('SENSOR_SOURCE', 'none')
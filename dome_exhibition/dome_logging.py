@@ -0,0 +1,110 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+
+# --- Logging Configuration ---
+# LOG_LEVEL      level of every logger, e.g. INFO (default) or DEBUG
+# LOG_LEVELS     per-module overrides, e.g. "led_renderer=DEBUG,app=WARNING"
+# LOG_FORMAT     'json' (default, one object per line) or 'text'
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+LOG_LEVELS = os.environ.get('LOG_LEVELS', '')
+LOG_FORMAT = os.environ.get('LOG_FORMAT', 'json')
+
+# Fields taken from `extra=` and written out when present
+CONTEXT_FIELDS = ('room', 'sid', 'username', 'game_level')
+
+_listener = None
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record with the room/sid context passed in extra."""
+
+    def format(self, record):
+        entry = {
+            'ts': round(record.created, 3),
+            'level': record.levelname,
+            'logger': record.name,
+            'thread': record.threadName,
+            'msg': record.getMessage()
+        }
+        for field in CONTEXT_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Readable one-line records for the console, context appended as key=value."""
+
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)s %(name)s: %(message)s')
+
+    def format(self, record):
+        line = super().format(record)
+        context = ' '.join(f"{field}={getattr(record, field)}" for field in CONTEXT_FIELDS
+                           if getattr(record, field, None) is not None)
+        return f"{line} [{context}]" if context else line
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """
+    Hand the record to the writer thread as it is. The message is merged
+    with its arguments here (they may change later) but the formatting and
+    the write to stderr happen on the writer thread.
+    """
+
+    def prepare(self, record):
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+def parse_levels(spec):
+    """Parse "module=LEVEL,..." into {module: level}."""
+    levels = {}
+    for item in spec.split(','):
+        if '=' not in item:
+            continue
+        name, level = item.split('=', 1)
+        levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def setup_logging(level=LOG_LEVEL, module_levels=LOG_LEVELS, log_format=LOG_FORMAT, stream=None):
+    """
+    Route every logger through a queue to one background writer thread, so
+    logging never blocks on the console in timing-critical code.
+    Safe to call more than once; later calls only update the levels.
+    """
+    global _listener
+    root = logging.getLogger()
+    root.setLevel(level)
+    for name, module_level in parse_levels(module_levels).items():
+        logging.getLogger(name).setLevel(module_level)
+    if _listener is not None:
+        return
+
+    output = logging.StreamHandler(stream or sys.stderr)
+    output.setFormatter(JsonFormatter() if log_format == 'json' else TextFormatter())
+    log_queue = queue.SimpleQueue()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(_QueueHandler(log_queue))
+    _listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+
+def shutdown_logging():
+    """Write out what is still queued and stop the writer thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
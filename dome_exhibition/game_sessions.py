@@ -0,0 +1,121 @@
+import logging
+import random
+import threading
+import time
+from collections import OrderedDict
+
+import sequence_codec
+
+log = logging.getLogger('game_sessions')
+
+# --- Session pool configuration ---
+MAX_SESSIONS = 256            # Most single-player games kept in memory at once
+SESSION_TTL = 30 * 60         # Seconds of inactivity before a game is dropped
+
+
+def random_code(level):
+    """Generate a random packed color sequence (see sequence_codec) for the given level."""
+    seq_length = min(2 + level, 10)
+    return (1 << (2 * seq_length)) | random.getrandbits(2 * seq_length)
+
+
+def random_sequence(level):
+    """Generate a random color sequence for the given level."""
+    return sequence_codec.decode(random_code(level))
+
+
+class GameState:
+    __slots__ = ('current_level', 'target_sequence', 'target_code', 'player_sequence',
+                 'player_score', 'game_active', 'first_mismatch', 'last_used',
+                 'player_name', 'game_key', 'input_opened_at')
+
+    def __init__(self):
+        self.current_level = 1
+        self.target_sequence = []
+        self.target_code = sequence_codec.EMPTY_CODE
+        self.player_sequence = []
+        self.player_score = 0
+        self.game_active = False
+        self.first_mismatch = -1
+        self.last_used = time.monotonic()
+        self.player_name = None
+        self.game_key = None          # Row of this game in game_store
+        self.input_opened_at = None   # When the last sequence finished on the dome
+
+    def generate_sequence(self, level=None):
+        """Generate a new color sequence"""
+        level = level or self.current_level
+        self.target_code = random_code(level)
+        self.target_sequence = sequence_codec.decode(self.target_code)
+        log.debug("生成新序列: %s", self.target_sequence)
+        self.player_sequence = []
+        return self.target_sequence
+
+    def reset_game(self):
+        """Reset the game status"""
+        self.current_level = 1
+        self.player_score = 0
+        self.game_active = False
+        self.target_sequence = []
+        self.target_code = sequence_codec.EMPTY_CODE
+        self.player_sequence = []
+        self.first_mismatch = -1
+
+    def check_sequence(self, player_sequence):
+        """
+        Verify the player sequence and update the score.
+        player_sequence may be a packed code or a list of colour names; the
+        index of the first wrong colour is kept in first_mismatch.
+        """
+        log.debug("对比玩家输入序列: %s 目标序列: %s", player_sequence, self.target_sequence)
+        self.first_mismatch = sequence_codec.first_mismatch(
+            sequence_codec.to_code(player_sequence), self.target_code)
+        if self.first_mismatch == -1:
+            # Calculate the score: base score + level bonus
+            self.player_score += 10 + (self.current_level * 10)
+            self.current_level += 1
+            return True
+        self.game_active = False
+        return False
+
+
+class GameStatePool:
+    """
+    One GameState per single-player session, so several phones can play at once.
+    Games are kept in least-recently-used order; the oldest are dropped when
+    the pool is full or when they have not been touched for `ttl` seconds.
+    """
+
+    def __init__(self, max_size=MAX_SESSIONS, ttl=SESSION_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._states = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the game of this session, creating it if needed."""
+        now = time.monotonic()
+        with self._lock:
+            state = self._states.get(key)
+            if state is None:
+                state = GameState()
+                self._states[key] = state
+            else:
+                self._states.move_to_end(key)
+            state.last_used = now
+            self._evict(now)
+        return state
+
+    def discard(self, key):
+        with self._lock:
+            self._states.pop(key, None)
+
+    def __len__(self):
+        return len(self._states)
+
+    def _evict(self, now):
+        while self._states:
+            key, oldest = next(iter(self._states.items()))
+            if len(self._states) <= self.max_size and now - oldest.last_used < self.ttl:
+                break
+            del self._states[key]
@@ -0,0 +1,266 @@
+import logging
+import os
+import queue
+import sqlite3
+import sys
+import threading
+import time
+
+log = logging.getLogger('game_store')
+
+# --- Store Configuration ---
+DB_PATH = os.environ.get(
+    'DOME_DB_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'dome.sqlite3'))
+BATCH_SIZE = 256          # Most writes committed in one transaction
+BATCH_INTERVAL = 0.5      # Seconds the writer collects writes before committing
+LEADERBOARD_SIZE = 10
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS players (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    best_score INTEGER NOT NULL DEFAULT 0,
+    best_level INTEGER NOT NULL DEFAULT 0,
+    games INTEGER NOT NULL DEFAULT 0,
+    first_seen REAL NOT NULL,
+    last_seen REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS players_best_score ON players (best_score DESC, last_seen);
+
+CREATE TABLE IF NOT EXISTS games (
+    id INTEGER PRIMARY KEY,
+    game_key TEXT NOT NULL UNIQUE,
+    mode TEXT NOT NULL,
+    room TEXT,
+    started_at REAL NOT NULL,
+    ended_at REAL
+);
+
+CREATE TABLE IF NOT EXISTS results (
+    game_id INTEGER NOT NULL REFERENCES games (id),
+    player_id INTEGER NOT NULL REFERENCES players (id),
+    score INTEGER NOT NULL,
+    max_level INTEGER NOT NULL,
+    ended_at REAL NOT NULL,
+    PRIMARY KEY (game_id, player_id)
+);
+CREATE INDEX IF NOT EXISTS results_score ON results (score DESC, ended_at);
+
+CREATE TABLE IF NOT EXISTS rounds (
+    id INTEGER PRIMARY KEY,
+    game_id INTEGER NOT NULL REFERENCES games (id),
+    player_id INTEGER NOT NULL REFERENCES players (id),
+    level INTEGER NOT NULL,
+    correct INTEGER NOT NULL,
+    score INTEGER NOT NULL,
+    answer_ms REAL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS rounds_game ON rounds (game_id);
+"""
+
+
+def run_blocking(fn, *args):
+    """
+    Call fn on a real OS thread when the server runs on green threads
+    (DOME_ASYNC_MODE=eventlet/gevent): a blocking sqlite3 commit on a green
+    thread would stall every client. A plain call otherwise.
+    """
+    if 'eventlet' in sys.modules:
+        from eventlet import patcher, tpool
+        if patcher.is_monkey_patched('thread'):
+            return tpool.execute(fn, *args)
+    if 'gevent' in sys.modules:
+        import gevent
+        from gevent import monkey
+        if monkey.is_module_patched('threading'):
+            return gevent.get_hub().threadpool.apply(fn, args)
+    return fn(*args)
+
+
+class GameStore:
+    """
+    Players, games, per-level rounds and final results in SQLite (WAL mode).
+    The record_* methods only put the write on a queue and return at once;
+    a background thread commits the queued writes in batches, so the game
+    code never waits on the disk. Under eventlet/gevent that thread is a
+    green thread, and the commits themselves go to an OS thread (run_blocking). Reads (leaderboard) use their own
+    connection per thread and are not blocked by the writer.
+    Parameter:
+        path (str): Database file, created on first use.
+    """
+
+    def __init__(self, path=DB_PATH, batch_size=BATCH_SIZE, batch_interval=BATCH_INTERVAL):
+        self.path = path
+        self.batch_size = batch_size
+        self.batch_interval = batch_interval
+        self.written = 0
+        self.batches = 0
+        self._queue = queue.SimpleQueue()
+        self._local = threading.local()
+        self._thread = None
+        self._player_ids = {}
+        self._game_ids = {}
+        with self._connect() as db:
+            db.executescript(SCHEMA)
+
+    def _connect(self):
+        # The writer's commits may run on a pool thread (run_blocking), one at a time
+        db = sqlite3.connect(self.path, timeout=5.0, check_same_thread=False)
+        db.execute('PRAGMA journal_mode=WAL')
+        # In WAL mode NORMAL only syncs at checkpoints: safe against crashes, cheap commits
+        db.execute('PRAGMA synchronous=NORMAL')
+        return db
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name='game-store', daemon=True)
+        self._thread.start()
+
+    def close(self):
+        """Commit everything still queued and stop the writer."""
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join()
+        self._thread = None
+
+    def flush(self, timeout=5.0):
+        """Wait until every write queued so far is committed."""
+        done = threading.Event()
+        self._queue.put(('flush', done))
+        return done.wait(timeout)
+
+    # --- Writes, queued ---
+    def record_player(self, name):
+        self._queue.put(('player', name, time.time()))
+
+    def start_game(self, game_key, mode, room=None):
+        self._queue.put(('start_game', game_key, mode, room, time.time()))
+
+    def record_round(self, game_key, player, level, correct, score, answer_ms=None):
+        if game_key is None:
+            return
+        self._queue.put(('round', game_key, player, level, correct, score, answer_ms, time.time()))
+
+    def end_game(self, game_key, results):
+        """results: {player: (score, max_level)}"""
+        if game_key is None:
+            return
+        self._queue.put(('end_game', game_key, dict(results), time.time()))
+
+    # --- Reads ---
+    def _reader(self):
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            db = self._local.db = self._connect()
+        return db
+
+    def top_players(self, limit=LEADERBOARD_SIZE):
+        """Best score of each player, highest first (walks the best_score index)."""
+        rows = self._reader().execute(
+            'SELECT name, best_score, best_level, games FROM players '
+            'WHERE games > 0 ORDER BY best_score DESC, last_seen LIMIT ?', (limit,)).fetchall()
+        return [{'username': name, 'score': score, 'level': level, 'games': games}
+                for name, score, level, games in rows]
+
+    def top_results(self, limit=LEADERBOARD_SIZE, since=None):
+        """Best single games, optionally only those ended after `since` (time.time())."""
+        rows = self._reader().execute(
+            'SELECT players.name, results.score, results.max_level, results.ended_at '
+            'FROM results JOIN players ON players.id = results.player_id '
+            'WHERE results.ended_at >= ? ORDER BY results.score DESC, results.ended_at LIMIT ?',
+            (since or 0, limit)).fetchall()
+        return [{'username': name, 'score': score, 'level': level, 'ended_at': ended_at}
+                for name, score, level, ended_at in rows]
+
+    def stats(self):
+        return {'queued': self._queue.qsize(), 'written': self.written, 'batches': self.batches}
+
+    # --- Writer thread ---
+    def _run(self):
+        db = run_blocking(self._connect)
+        running = True
+        while running:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.batch_interval
+            while len(batch) < self.batch_size and batch[-1] is not None and batch[-1][0] != 'flush':
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            if batch[-1] is None:
+                running = False
+                batch.pop()
+            flushed = [item[1] for item in batch if item[0] == 'flush']
+            writes = [item for item in batch if item[0] != 'flush']
+            if writes:
+                try:
+                    run_blocking(self._commit, db, writes)
+                    self.written += len(writes)
+                    self.batches += 1
+                except sqlite3.Error:
+                    log.exception("写入数据库失败, 丢弃 %d 条记录", len(writes))
+                    self._player_ids.clear()
+                    self._game_ids.clear()
+            for done in flushed:
+                done.set()
+        run_blocking(db.close)
+
+    def _commit(self, db, writes):
+        """Apply the writes in one transaction."""
+        with db:
+            for item in writes:
+                getattr(self, '_write_' + item[0])(db, *item[1:])
+
+    def _player_id(self, db, name, now):
+        player_id = self._player_ids.get(name)
+        if player_id is None:
+            db.execute('INSERT INTO players (name, first_seen, last_seen) VALUES (?, ?, ?) '
+                       'ON CONFLICT (name) DO UPDATE SET last_seen = excluded.last_seen', (name, now, now))
+            player_id = db.execute('SELECT id FROM players WHERE name = ?', (name,)).fetchone()[0]
+            self._player_ids[name] = player_id
+        return player_id
+
+    def _game_id(self, db, game_key, now):
+        game_id = self._game_ids.get(game_key)
+        if game_id is None:
+            row = db.execute('SELECT id FROM games WHERE game_key = ?', (game_key,)).fetchone()
+            if row is None:
+                # Round of a game whose start was never recorded
+                self._write_start_game(db, game_key, 'unknown', None, now)
+                return self._game_ids[game_key]
+            game_id = self._game_ids[game_key] = row[0]
+        return game_id
+
+    def _write_player(self, db, name, now):
+        player_id = self._player_id(db, name, now)
+        db.execute('UPDATE players SET last_seen = ? WHERE id = ?', (now, player_id))
+
+    def _write_start_game(self, db, game_key, mode, room, now):
+        cursor = db.execute('INSERT OR IGNORE INTO games (game_key, mode, room, started_at) VALUES (?, ?, ?, ?)',
+                            (game_key, mode, room, now))
+        if cursor.rowcount:
+            self._game_ids[game_key] = cursor.lastrowid
+
+    def _write_round(self, db, game_key, player, level, correct, score, answer_ms, now):
+        db.execute('INSERT INTO rounds (game_id, player_id, level, correct, score, answer_ms, created_at) '
+                   'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                   (self._game_id(db, game_key, now), self._player_id(db, player, now),
+                    level, int(correct), score, answer_ms, now))
+
+    def _write_end_game(self, db, game_key, results, now):
+        game_id = self._game_id(db, game_key, now)
+        db.execute('UPDATE games SET ended_at = ? WHERE id = ?', (now, game_id))
+        for player, (score, max_level) in results.items():
+            player_id = self._player_id(db, player, now)
+            db.execute('INSERT OR REPLACE INTO results (game_id, player_id, score, max_level, ended_at) '
+                       'VALUES (?, ?, ?, ?, ?)', (game_id, player_id, score, max_level, now))
+            db.execute('UPDATE players SET best_score = MAX(best_score, ?), best_level = MAX(best_level, ?), '
+                       'games = games + 1, last_seen = ? WHERE id = ?', (score, max_level, now, player_id))
+        # Finished games are not looked up again
+        self._game_ids.pop(game_key, None)
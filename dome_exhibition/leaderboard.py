@@ -0,0 +1,88 @@
+import bisect
+import itertools
+import threading
+
+# --- Leaderboard Configuration ---
+LEADERBOARD_SIZE = 10
+PUSH_INTERVAL = 1.0       # Seconds between leaderboard_diff pushes, at most
+
+
+class Leaderboard:
+    """
+    Top players by best score, kept sorted as scores come in.
+    Only the best `size` entries are stored, as (-score, order, name) keys
+    in a sorted list; a best score never goes down, so a player that drops
+    out of the top can only come back with a higher score. An update is a
+    dict lookup plus a bisect in a list of `size` items, nothing is ever
+    re-sorted. Ties keep whoever reached the score first.
+    Parameter:
+        size (int): Number of places on the board.
+    """
+
+    def __init__(self, size=LEADERBOARD_SIZE):
+        self.size = size
+        self.version = 0
+        self._entries = []      # Sorted keys (-score, order, name)
+        self._keys = {}         # name -> its key in _entries
+        self._order = itertools.count()
+        self._lock = threading.Lock()
+        self._pushed = []       # [(name, score)] as of the last take_diff()
+        self._pushed_version = 0
+
+    def load(self, players):
+        """Seed from game_store.top_players(), best first."""
+        for player in players:
+            self.update(player['username'], player['score'])
+        self.take_diff()
+
+    def update(self, name, score):
+        """Report the current score of a player; True when the board changed."""
+        with self._lock:
+            key = self._keys.get(name)
+            if key is not None:
+                if score <= -key[0]:
+                    return False
+                del self._entries[bisect.bisect_left(self._entries, key)]
+            elif len(self._entries) >= self.size and score <= -self._entries[-1][0]:
+                return False
+            key = (-score, next(self._order), name)
+            bisect.insort(self._entries, key)
+            self._keys[name] = key
+            if len(self._entries) > self.size:
+                del self._keys[self._entries.pop()[2]]
+            self.version += 1
+            return True
+
+    def top(self):
+        with self._lock:
+            return [(name, -negative_score) for negative_score, _, name in self._entries]
+
+    def snapshot(self):
+        """
+        The board as of the last diff, sent to a client when it starts
+        watching; the next leaderboard_diff applies on top of it.
+        """
+        with self._lock:
+            return {
+                'version': self._pushed_version,
+                'players': [{'username': name, 'score': score} for name, score in self._pushed]
+            }
+
+    def take_diff(self):
+        """
+        Places that changed since the previous call, or None if nothing did.
+        Updates in between are coalesced: a client applies 'changed' to the
+        board it got at version 'base' and trims it to 'length'; a client on
+        another version asks for a new snapshot instead.
+        """
+        with self._lock:
+            if self.version == self._pushed_version:
+                return None
+            current = [(name, -negative_score) for negative_score, _, name in self._entries]
+            changed = [[rank, name, score] for rank, (name, score) in enumerate(current)
+                       if rank >= len(self._pushed) or self._pushed[rank] != (name, score)]
+            diff = {'base': self._pushed_version, 'version': self.version,
+                    'length': len(current), 'changed': changed}
+            self._pushed = current
+            self._pushed_version = self.version
+            return diff
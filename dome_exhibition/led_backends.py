@@ -0,0 +1,223 @@
+import struct
+import time
+from array import array
+from collections import deque
+
+# Capture file layout (little endian):
+#   header: magic (8 bytes), led_count (uint32), frame_count (uint32)
+#   frame:  timestamp (float64, time.monotonic() seconds) + led_count uint32 colours
+CAPTURE_MAGIC = b'DOMECAP1'
+CAPTURE_HEADER = struct.Struct('<8sII')
+CAPTURE_TIMESTAMP = struct.Struct('<d')
+
+CAPTURE_FRAMES = 1024     # Frames kept by the simulator ring buffer
+
+
+class StripBackend:
+    """
+    Interface every LED output implements, a subset of rpi_ws281x.PixelStrip
+    plus write() for handing over a whole frame at once.
+    """
+
+    def __init__(self, num):
+        self.num = num
+
+    def begin(self):
+        pass
+
+    def numPixels(self):
+        return self.num
+
+    def setPixelColor(self, index, color):
+        raise NotImplementedError
+
+    def write(self, pixels, start=0, end=None):
+        """Copy pixels[start:end] of a frame (array of colours) into the strip."""
+        end = len(pixels) if end is None else end
+        for i in range(start, end):
+            self.setPixelColor(i, pixels[i])
+
+    def show(self):
+        raise NotImplementedError
+
+
+def write_frame(target, pixels, start=0, end=None):
+    """
+    Hand pixels[start:end] of a frame to any strip object in the cheapest
+    way it supports: write() for our backends, the sliceable _led_data of
+    rpi_ws281x, or one setPixelColor per LED as a last resort.
+    """
+    end = len(pixels) if end is None else end
+    if isinstance(target, StripBackend):
+        target.write(pixels, start, end)
+        return
+    led_data = getattr(target, '_led_data', None)
+    if led_data is not None:
+        led_data[start:end] = pixels[start:end]
+    else:
+        for i in range(start, end):
+            target.setPixelColor(i, pixels[i])
+
+
+def contiguous_index_maps(strip_counts):
+    """Index maps for strips chained one after another: strip 0 holds LEDs 0..n0-1 and so on."""
+    maps = []
+    start = 0
+    for count in strip_counts:
+        maps.append(array('H', range(start, start + count)))
+        start += count
+    return maps
+
+
+class DummyStrip(StripBackend):
+    """Drops every write; only counts show() calls."""
+
+    def __init__(self, num):
+        super().__init__(num)
+        self.show_count = 0
+
+    def setPixelColor(self, index, color):
+        pass
+
+    def write(self, pixels, start=0, end=None):
+        pass
+
+    def show(self):
+        self.show_count += 1
+
+
+class SimulatorStrip(StripBackend):
+    """
+    Keeps a real pixel buffer and records every show() as a timestamped frame
+    in a ring buffer, so playback can be checked and timed without a Pi.
+    """
+
+    def __init__(self, num, capture_frames=CAPTURE_FRAMES):
+        super().__init__(num)
+        self.pixels = array('I', [0]) * num
+        self.frames = deque(maxlen=capture_frames)
+        self.show_count = 0
+
+    def setPixelColor(self, index, color):
+        self.pixels[index] = color
+
+    def getPixelColor(self, index):
+        return self.pixels[index]
+
+    def write(self, pixels, start=0, end=None):
+        end = len(pixels) if end is None else end
+        self.pixels[start:end] = pixels[start:end]
+
+    def show(self):
+        self.show_count += 1
+        self.frames.append((time.monotonic(), self.pixels.tobytes()))
+
+    def clear_capture(self):
+        self.frames.clear()
+
+    def frame_pixels(self, index):
+        """Colours of a captured frame as an array('I')."""
+        pixels = array('I')
+        pixels.frombytes(self.frames[index][1])
+        return pixels
+
+    def stats(self):
+        """Frame count, time span and frame rate of the capture."""
+        if len(self.frames) < 2:
+            return {'frames': len(self.frames), 'duration_s': 0.0, 'fps': 0.0}
+        duration = self.frames[-1][0] - self.frames[0][0]
+        return {
+            'frames': len(self.frames),
+            'duration_s': round(duration, 4),
+            'fps': round((len(self.frames) - 1) / duration, 2) if duration > 0 else 0.0
+        }
+
+    def dump(self, path):
+        """Write the captured frames to a compact binary file."""
+        with open(path, 'wb') as f:
+            f.write(CAPTURE_HEADER.pack(CAPTURE_MAGIC, self.num, len(self.frames)))
+            for timestamp, data in self.frames:
+                f.write(CAPTURE_TIMESTAMP.pack(timestamp))
+                f.write(data)
+
+
+def load_capture(path):
+    """Read a file written by SimulatorStrip.dump() into [(timestamp, array('I')), ...]."""
+    with open(path, 'rb') as f:
+        magic, led_count, frame_count = CAPTURE_HEADER.unpack(f.read(CAPTURE_HEADER.size))
+        if magic != CAPTURE_MAGIC:
+            raise ValueError(f"Not a dome capture file: {path}")
+        frames = []
+        for _ in range(frame_count):
+            timestamp, = CAPTURE_TIMESTAMP.unpack(f.read(CAPTURE_TIMESTAMP.size))
+            pixels = array('I')
+            pixels.frombytes(f.read(led_count * 4))
+            frames.append((timestamp, pixels))
+    return frames
+
+
+class MultiStrip(StripBackend):
+    """
+    Several physical strips presented as one logical strip.
+    The logical-to-physical mapping is precomputed into lookup arrays, and
+    show() starts every strip back to back: rpi_ws281x returns as soon as the
+    DMA transfer of a strip has started, so strips on different DMA channels
+    send their data at the same time and more strips do not add frame time.
+    Strips untouched by the last write() are not shown again.
+    Parameter:
+        strips (list): Physical strip objects, in output order.
+        index_maps (list): For each strip, array('H') of the logical LED
+            shown at every physical position.
+        dma_channels (list): DMA channel of each strip; they must all differ.
+    """
+
+    def __init__(self, strips, index_maps, dma_channels=None):
+        super().__init__(sum(len(index_map) for index_map in index_maps))
+        if dma_channels is not None and len(set(dma_channels)) != len(dma_channels):
+            raise ValueError(f"Every strip needs its own DMA channel, got {dma_channels}")
+        self.strips = strips
+        self.index_maps = index_maps
+        self._dirty = [True] * len(strips)
+        self.skipped_shows = 0
+
+        # Lookup arrays: logical LED -> (strip, physical position)
+        self.logical_strip = array('B', [0]) * self.num
+        self.logical_position = array('H', [0]) * self.num
+        # A strip fed from one run of logical LEDs is copied with a slice
+        self._slices = []
+        for strip_index, index_map in enumerate(index_maps):
+            for position, logical in enumerate(index_map):
+                self.logical_strip[logical] = strip_index
+                self.logical_position[logical] = position
+            if index_map and list(index_map) == list(range(index_map[0], index_map[0] + len(index_map))):
+                self._slices.append(slice(index_map[0], index_map[0] + len(index_map)))
+            else:
+                self._slices.append(None)
+
+    def begin(self):
+        for strip in self.strips:
+            strip.begin()
+
+    def setPixelColor(self, index, color):
+        self.strips[self.logical_strip[index]].setPixelColor(self.logical_position[index], color)
+
+    def write(self, pixels, start=0, end=None):
+        end = len(pixels) if end is None else end
+        for strip_index, (strip, index_map, run) in enumerate(zip(self.strips, self.index_maps, self._slices)):
+            if run is None:
+                write_frame(strip, array('I', map(pixels.__getitem__, index_map)))
+            else:
+                # Only the part of this strip's run that overlaps start..end
+                low, high = max(start, run.start), min(end, run.stop)
+                if low >= high:
+                    continue
+                write_frame(strip, pixels[run], low - run.start, high - run.start)
+            self._dirty[strip_index] = True
+
+    def show(self):
+        for strip_index, strip in enumerate(self.strips):
+            if self._dirty[strip_index]:
+                strip.show()
+                self._dirty[strip_index] = False
+            else:
+                self.skipped_shows += 1
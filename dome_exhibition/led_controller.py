@@ -1,38 +1,55 @@
+import json
+import logging
+import os
+import threading
 import time
+from array import array
+
+import led_backends
+import led_correction
+import led_timeline
+import metrics
+import sequence_codec
+import sequence_timing
+
+log = logging.getLogger('led_controller')
 
 # Attempt to import rpi_ws281x for LED control.
-# If not on a Raspberry Pi, a dummy class will be used.
+# If not on a Raspberry Pi, a backend from led_backends will be used.
 try:
     from rpi_ws281x import PixelStrip, Color
-    print("rpi_ws281x imported successfully.")
+    log.info("rpi_ws281x imported successfully.")
     IS_RPI_ENV = True
 except ImportError:
-    print("rpi_ws281x not found. Running in non-Raspberry Pi environment. LED control will be simulated.")
+    log.info("rpi_ws281x not found. Running in non-Raspberry Pi environment. LED control will be simulated.")
     IS_RPI_ENV = False
 
     # Dummy classes for non-Raspberry Pi environment
-    class Color:
-        def __init__(self, r, g, b):
-            pass
-
-    class PixelStrip:
-        def __init__(self, *args, **kwargs):
-            pass
-        def begin(self):
-            pass
-        def setPixelColor(self, index, color):
-            pass
-        def show(self):
-            pass
+    def Color(red, green, blue, white=0):
+        """Pack the colour into a 24-bit integer, the same way rpi_ws281x does."""
+        return (white << 24) | (red << 16) | (green << 8) | blue
 
 # --- LED Configuration ---
-LED_COUNT = 120
-LED_PIN = 18 
 LED_FREQ_HZ = 800000
-LED_DMA = 10      
-LED_BRIGHTNESS = 50 
+LED_BRIGHTNESS = int(os.environ.get('LED_BRIGHTNESS', '50'))  # Starting global brightness, see set_brightness()
+LED_HW_BRIGHTNESS = 255   # Strips run at full scale; dimming is done by the output correction
 LED_INVERT = False
-LED_CHANNEL = 0
+
+# One entry per physical strip: (led_count, gpio_pin, dma_channel, pwm_channel).
+# Logical LED indices run through the strips in this order. Every strip needs
+# its own DMA channel so that their transfers can run at the same time.
+LED_STRIPS = [
+    (60, 18, 10, 0),   # Strip 1: LED 0-59
+    (60, 13, 11, 1),   # Strip 2: LED 60-119
+]
+LED_COUNT = sum(strip_config[0] for strip_config in LED_STRIPS)
+LED_PIN = LED_STRIPS[0][1]
+LED_DMA = LED_STRIPS[0][2]
+LED_CHANNEL = LED_STRIPS[0][3]
+
+# Output backend: 'rpi' (real strip), 'simulator' (pixel buffer with frame
+# capture) or 'dummy' (drops every write). Off the Pi the simulator is used.
+LED_BACKEND = os.environ.get('LED_BACKEND', 'rpi' if IS_RPI_ENV else 'simulator')
 
 # Basic Color Definitions
 RED_COLOR = Color(255, 0, 0)
@@ -41,23 +58,191 @@ BLUE_COLOR = Color(0, 0, 255)
 GREEN_COLOR = Color(0, 255, 0)
 OFF_COLOR = Color(0, 0, 0)
 
-# Zone Definitions (each zone 30 LEDs)
-ZONE_SIZE = 30
-ZONES = {
-    'red': (0, ZONE_SIZE),           
-    'yellow': (ZONE_SIZE, ZONE_SIZE * 2),   
-    'blue': (ZONE_SIZE * 2, ZONE_SIZE * 3), 
-    'green': (ZONE_SIZE * 3, ZONE_SIZE * 4) 
-}
+# Zone Definitions
+# Zones are read from zone_map.json (or the file in LED_ZONE_MAP) as lists of
+# [start, end) segments, so one zone can be spread over both strips.
+# At startup every zone is compiled into sorted, merged runs, and lighting a
+# zone is one slice assignment per run whatever the size of the map.
+ZONE_MAP_PATH = os.environ.get(
+    'LED_ZONE_MAP', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'zone_map.json'))
+
+def load_zone_map(path, led_count):
+    """
+    Read a zone map file and compile it into {zone_name: ((start, end), ...)}.
+    Raises ValueError if a segment is outside the strip or a palette colour has no zone.
+    """
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+
+    zones = {}
+    for zone_name, segments in data['zones'].items():
+        runs = []
+        for start, end in sorted(segments):
+            if not 0 <= start < end <= led_count:
+                raise ValueError(f"Zone '{zone_name}' segment [{start}, {end}) is outside 0-{led_count}")
+            if runs and start <= runs[-1][1]:
+                runs[-1] = (runs[-1][0], max(runs[-1][1], end))
+            else:
+                runs.append((start, end))
+        zones[zone_name] = tuple(runs)
+
+    missing = [name for name in sequence_codec.PALETTE if name not in zones]
+    if missing:
+        raise ValueError(f"Zone map {path} has no zone for {missing}")
+    return zones
+
+ZONES = load_zone_map(ZONE_MAP_PATH, LED_COUNT)
+
+# --- Frame Buffer ---
+class FrameBuffer:
+    """
+    Compact copy of every pixel on the strip, stored as one array('I').
+    Zones are filled with slice assignments and the whole buffer is pushed
+    to the PixelStrip in a single transfer, instead of one setPixelColor
+    call per LED.
+    At push time the frame goes through the output correction (gamma,
+    global brightness and power limit) in one step. The last corrected
+    frame sent to the strip is kept, so a push only writes the range that
+    changed and skips show() when nothing changed at all.
+    """
+
+    # Pixels compared per step when looking for the changed range
+    DIRTY_CHUNK = 16
+
+    def __init__(self, size, correction=None):
+        self.size = size
+        self.pixels = array('I', [0]) * size
+        self.committed = array('I', [0]) * size
+        self.correction = correction
+        self._committed_target = None
+        self._lock = threading.Lock()
+        self.pushes = 0
+        self.skipped_pushes = 0
+        self.pixels_written = 0
+
+    def fill(self, start, end, color):
+        """Set LEDs start..end-1 to the same color."""
+        self.pixels[start:end] = array('I', [color]) * (end - start)
+
+    def fill_runs(self, runs, color):
+        """Set every (start, end) run of a compiled zone to the same color."""
+        for start, end in runs:
+            self.pixels[start:end] = array('I', [color]) * (end - start)
+
+    def clear(self):
+        """Set every LED to off."""
+        self.fill(0, self.size, OFF_COLOR)
+
+    def output(self):
+        """The frame as it is sent to the strip, after the output correction."""
+        if self.correction is None:
+            return self.pixels
+        return self.correction.apply(self.pixels)
+
+    def dirty_range(self, pixels=None):
+        """
+        Return (start, end) covering every pixel of the output frame that
+        differs from the last committed frame, or None. Compares DIRTY_CHUNK
+        pixels at a time, so the range is rounded out to whole chunks.
+        """
+        pixels = self.output() if pixels is None else pixels
+        committed = self.committed
+        if pixels == committed:
+            return None
+        chunk = self.DIRTY_CHUNK
+        start = 0
+        while pixels[start:start + chunk] == committed[start:start + chunk]:
+            start += chunk
+        end = self.size
+        while True:
+            low = max(end - chunk, start)
+            if pixels[low:end] != committed[low:end]:
+                break
+            end = low
+        return start, end
+
+    def push(self, target):
+        """
+        Copy the changed part of the buffer into the strip and latch it with
+        show(), handing over the pixels in one call (see led_backends.write_frame).
+        Returns False when the frame was already on the strip and nothing was sent.
+        """
+        if target is None:
+            return False
+        with self._lock:
+            pixels = self.output()
+            if target is self._committed_target:
+                dirty = self.dirty_range(pixels)
+                if dirty is None:
+                    self.skipped_pushes += 1
+                    return False
+                start, end = dirty
+            else:
+                start, end = 0, self.size
+                self._committed_target = target
+            show_started = time.perf_counter()
+            led_backends.write_frame(target, pixels, start, end)
+            target.show()
+            metrics.led_show_seconds.observe(time.perf_counter() - show_started)
+            self.committed[start:end] = pixels[start:end]
+            self.pushes += 1
+            self.pixels_written += end - start
+        return True
+
+    def stats(self):
+        """Counters of pushes sent, pushes skipped and pixels written."""
+        return {
+            'pushes': self.pushes,
+            'skipped_pushes': self.skipped_pushes,
+            'pixels_written': self.pixels_written
+        }
+
+
+# Gamma, global brightness and current limit applied to every pushed frame
+output_correction = led_correction.OutputCorrection(LED_BRIGHTNESS)
+
+# The frame buffer is kept in both environments, so the simulated
+# environment sees exactly the same pixel state as the real strip.
+framebuffer = FrameBuffer(LED_COUNT, output_correction)
+
+# How late the edges of played sequences fired compared to their deadline
+playback_jitter = sequence_timing.JitterStats()
 
 # Create LED strip object
-strip = None
-if IS_RPI_ENV:
-    strip = PixelStrip(LED_COUNT, LED_PIN, LED_FREQ_HZ, LED_DMA, LED_INVERT, LED_BRIGHTNESS, LED_CHANNEL)
-    strip.begin()
-    print("LED strip initialized on Raspberry Pi.")
+def create_strip(backend):
+    """Build and start the strip for a backend name ('rpi', 'simulator' or 'dummy')."""
+    if backend == 'rpi':
+        if not IS_RPI_ENV:
+            raise RuntimeError("The 'rpi' LED backend needs rpi_ws281x")
+        strips = [PixelStrip(count, pin, LED_FREQ_HZ, dma, LED_INVERT, LED_HW_BRIGHTNESS, channel)
+                  for count, pin, dma, channel in LED_STRIPS]
+        if len(strips) == 1:
+            new_strip = strips[0]
+        else:
+            new_strip = led_backends.MultiStrip(
+                strips,
+                led_backends.contiguous_index_maps([count for count, _, _, _ in LED_STRIPS]),
+                [dma for _, _, dma, _ in LED_STRIPS])
+    elif backend == 'simulator':
+        new_strip = led_backends.SimulatorStrip(LED_COUNT)
+    elif backend == 'dummy':
+        new_strip = led_backends.DummyStrip(LED_COUNT)
+    else:
+        raise ValueError(f"Unknown LED backend: {backend!r}")
+    new_strip.begin()
+    return new_strip
+
+def set_backend(backend):
+    """Swap the output at runtime, e.g. for tests and benchmarks. Returns the new strip."""
+    global strip
+    strip = create_strip(backend) if isinstance(backend, str) else backend
+    return strip
+
+strip = create_strip(LED_BACKEND)
+if LED_BACKEND == 'rpi':
+    log.info("LED strip initialized on Raspberry Pi.")
 else:
-    print("LED strip not initialized (not on Raspberry Pi).")
+    log.info("LED strip not initialized on Raspberry Pi, using the '%s' backend.", LED_BACKEND)
 
 # --- LED Control Functions ---
 def get_color_object(color_name):
@@ -70,6 +255,13 @@ def get_color_object(color_name):
     }
     return colors.get(color_name, OFF_COLOR)
 
+def set_led_color(led_index, color):
+    """
+    Set the color of one logical LED (0 to LED_COUNT-1) in the frame buffer.
+    The change is sent to the strips by the next push.
+    """
+    framebuffer.pixels[led_index] = color
+
 def light_zone(zone_name, duration=0.8):
     """
     Light up the designated LED area and keep it on for a period of time.
@@ -78,19 +270,13 @@ def light_zone(zone_name, duration=0.8):
         duration (float): The time when the area remains lit, measured in seconds.
     """
     color = get_color_object(zone_name)
-    if not IS_RPI_ENV:
-        print(f"模拟LED: {zone_name}， {color}， {duration} ")
-        time.sleep(duration)
-        return
-
     if zone_name not in ZONES:
-        print(f"错误:'{zone_name}'")
+        log.error("错误:'%s'", zone_name)
         return
 
-    start, end = ZONES[zone_name]
-    for i in range(start, end):
-        strip.setPixelColor(i, color)
-    strip.show()
+    framebuffer.fill_runs(ZONES[zone_name], color)
+    log.debug("模拟LED: %s， %06x， %s", zone_name, color, duration)
+    framebuffer.push(strip)
     time.sleep(duration)
 
 def turn_off_zone(zone_name):
@@ -99,28 +285,75 @@ def turn_off_zone(zone_name):
     Parameter:
         zone_name (str):
     """
-    if not IS_RPI_ENV:
-        print(f"模拟LED: {zone_name}")
-        return
-
     if zone_name not in ZONES:
-        print(f"错误:'{zone_name}'")
+        log.error("错误:'%s'", zone_name)
         return
 
-    start, end = ZONES[zone_name]
-    for i in range(start, end):
-        strip.setPixelColor(i, OFF_COLOR)
-    strip.show()
+    framebuffer.fill_runs(ZONES[zone_name], OFF_COLOR)
+    log.debug("模拟LED: %s", zone_name)
+    framebuffer.push(strip)
 
 def turn_off_all_leds():
     """Turn off all the leds on the light strip."""
-    if not IS_RPI_ENV:
-        print("Simulated LED: Turn off all LEDs.")
-        return
-    for i in range(LED_COUNT):
-        strip.setPixelColor(i, OFF_COLOR)
-    strip.show()
-    print("All LEDs have been turned off.")
+    framebuffer.clear()
+    framebuffer.push(strip)
+    log.debug("All LEDs have been turned off.")
+
+# Full frames already built for a zone mask and colour, see zone_frame()
+_zone_frames = {}
+
+def zone_frame(mask, color_index=-1):
+    """
+    Return a complete frame with the zones in mask lit, built once and cached.
+    Parameter:
+        mask (int): Bit n lights zone sequence_codec.PALETTE[n].
+        color_index (int): Palette index of the colour to use, or -1 to give
+            every zone its own colour.
+    """
+    key = (mask, color_index)
+    frame = _zone_frames.get(key)
+    if frame is None:
+        frame = array('I', [OFF_COLOR]) * LED_COUNT
+        for index, zone_name in enumerate(sequence_codec.PALETTE):
+            if mask >> index & 1:
+                color_name = sequence_codec.PALETTE[color_index] if color_index >= 0 else zone_name
+                color = get_color_object(color_name)
+                for start, end in ZONES[zone_name]:
+                    frame[start:end] = array('I', [color]) * (end - start)
+        _zone_frames[key] = frame
+    return frame
+
+def show_zone_frame(zone_name=None):
+    """
+    Replace the whole frame with a single lit zone (or all off) and push it.
+    Unlike light_zone this never sleeps; timing is left to the caller.
+    Parameter:
+        zone_name (str): Zone to light, or None to turn every LED off.
+    """
+    symbol = sequence_codec.SYMBOLS.get(zone_name)
+    show_pixels(zone_frame(0) if symbol is None else zone_frame(1 << symbol, symbol))
+
+def show_pixels(pixels):
+    """Copy a complete frame (LED_COUNT colours) into the buffer and push it."""
+    framebuffer.pixels[:] = pixels
+    framebuffer.push(strip)
+
+def set_brightness(brightness):
+    """
+    Change the global brightness (0-255) without touching the strip setup,
+    e.g. for night mode. The frame on the dome is pushed again at once.
+    Returns the brightness actually set.
+    """
+    brightness = output_correction.set_brightness(brightness)
+    framebuffer.push(strip)
+    return brightness
+
+def frame_stats():
+    """How many pushes were sent or skipped, pixels written and strip shows skipped."""
+    stats = framebuffer.stats()
+    stats['skipped_strip_shows'] = getattr(strip, 'skipped_shows', 0)
+    stats['output'] = output_correction.stats()
+    return stats
 
 def play_sequence(sequence, light_duration_per_color=0.8, off_duration_between_colors=0.2):
     """
@@ -128,20 +361,43 @@ def play_sequence(sequence, light_duration_per_color=0.8, off_duration_between_c
     For each color in the sequence, it will light up the corresponding area,
     Then close the area and have a brief pause between the two.
     Finally, it ensures that all the leds have been turned off.
+    Every on and off edge has an absolute deadline, so the time spent
+    drawing does not add up as drift; how late each edge fired is recorded
+    in playback_jitter.
 
     Parameter:
         sequence (list): (For example, ['red', 'blue', 'yellow'])。
         light_duration_per_color (float): 每个LED区域保持点亮的时间 (秒)。
         off_duration_between_colors (float): 关闭一个区域与点亮序列中下一个区域之间的时间 (秒)。
+    Return:
+        list: Lateness of every edge in seconds.
     """
-    print(f"Play LED sequence: {sequence}")
-    for color_name in sequence:
-        light_zone(color_name, light_duration_per_color)
-        turn_off_zone(color_name)
-        time.sleep(off_duration_between_colors)
+    log.debug("Play LED sequence: %s", sequence)
+    timeline = led_timeline.build_timeline(sequence, light_duration_per_color, off_duration_between_colors)
+    start = time.monotonic()
+    lateness = []
+    for offset, mask, color_index in timeline.events():
+        deadline = start + offset
+        sequence_timing.sleep_until(deadline)
+        show_pixels(zone_frame(mask, color_index))
+        late = time.monotonic() - deadline
+        playback_jitter.record(late)
+        metrics.led_edge_lateness_seconds.observe(late, 'play_sequence')
+        lateness.append(late)
+
+    log.debug("The LED sequence playback is complete.")
+    return lateness
+
 
-    turn_off_all_leds() 
-    print("The LED sequence playback is complete.")
+def test_all_zones():
+    """Light every zone in turn, used by test_leds.py to check the wiring."""
+    log.info("Start testing all LED areas...")
+    for color in sequence_codec.PALETTE:
+        log.info("Test the %s area...", color)
+        light_zone(color, 1.0)
+        turn_off_zone(color)
+        time.sleep(0.5)
+    log.info("LED area test completed.")
 
 
 # Call turn_off_all_leds when the module is imported or script exits
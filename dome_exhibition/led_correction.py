@@ -0,0 +1,93 @@
+import os
+import threading
+from array import array
+
+# --- Output correction configuration ---
+# WS2812 LEDs are linear in PWM duty, the eye is not: a gamma curve makes
+# mid-level colours (the yellow zone, fades) look right. 1.0 turns it off.
+LED_GAMMA = float(os.environ.get('LED_GAMMA', '2.8'))
+
+# Power budget of the 5V supply feeding the strips, in milliamps.
+# A WS2812B draws about 20 mA per colour channel at full duty plus about
+# 1 mA when dark, so full white on 120 LEDs would need 7.3 A.
+LED_MAX_CURRENT_MA = int(os.environ.get('LED_MAX_CURRENT_MA', '4000'))
+LED_CHANNEL_MA = 20.0
+LED_IDLE_MA = 1.0
+
+# SCALE_TABLES[level] maps a colour channel 0-255 to channel * level / 255.
+# bytes.translate() applies one of them to every channel of a frame at once.
+SCALE_TABLES = [bytes(round(value * level / 255) for value in range(256)) for level in range(256)]
+# Same, rounded down: no channel ends up above its exact share, so a frame
+# scaled for the current limit never draws more than the level allows
+LIMIT_TABLES = [bytes(value * level // 255 for value in range(256)) for level in range(256)]
+
+
+def gamma_table(gamma):
+    """256-entry table mapping a linear channel value to its gamma-corrected duty."""
+    return bytes(round(((value / 255) ** gamma) * 255) for value in range(256))
+
+
+class OutputCorrection:
+    """
+    Turn a frame of colours into what is actually sent to the strip:
+    gamma correction and global brightness are folded into one 256-entry
+    table and applied to every channel of the frame with bytes.translate(),
+    then the frame is scaled down further if it would draw more current
+    than the supply can give.
+    Brightness can be changed at any time (night mode, power limits); the
+    hardware brightness of the strip stays at 255.
+    Parameter:
+        brightness (int): Global brightness 0-255.
+        gamma (float): Gamma of the correction curve.
+        max_current_ma (int): Current budget of a frame, 0 for no limit.
+    """
+
+    def __init__(self, brightness=255, gamma=LED_GAMMA, max_current_ma=LED_MAX_CURRENT_MA):
+        self.gamma = gamma
+        self.max_current_ma = max_current_ma
+        self._gamma = gamma_table(gamma)
+        self._lock = threading.Lock()
+        self.brightness = 255
+        self.table = self._gamma
+        self.set_brightness(brightness)
+        self.limited_frames = 0
+        self.last_current_ma = 0.0
+        self.peak_current_ma = 0.0
+
+    def set_brightness(self, brightness):
+        brightness = min(max(int(brightness), 0), 255)
+        table = self._gamma.translate(SCALE_TABLES[brightness])
+        with self._lock:
+            self.brightness = brightness
+            self.table = table
+        return brightness
+
+    def estimate_current_ma(self, data):
+        """Current drawn by a frame of corrected bytes (4 per LED, white byte unused)."""
+        return sum(data) * LED_CHANNEL_MA / 255 + len(data) // 4 * LED_IDLE_MA
+
+    def apply(self, pixels):
+        """Return the corrected, power-limited copy of a frame (array('I'))."""
+        data = pixels.tobytes().translate(self.table)
+        current = self.estimate_current_ma(data)
+        if self.max_current_ma and current > self.max_current_ma:
+            idle = len(data) // 4 * LED_IDLE_MA
+            # Round down, both the level and every channel: the budget must never be exceeded
+            level = int(255 * (self.max_current_ma - idle) / (current - idle))
+            data = data.translate(LIMIT_TABLES[max(level, 0)])
+            current = self.estimate_current_ma(data)
+            self.limited_frames += 1
+        self.last_current_ma = current
+        if current > self.peak_current_ma:
+            self.peak_current_ma = current
+        return array('I', data)
+
+    def stats(self):
+        return {
+            'brightness': self.brightness,
+            'gamma': self.gamma,
+            'max_current_ma': self.max_current_ma,
+            'last_current_ma': round(self.last_current_ma, 1),
+            'peak_current_ma': round(self.peak_current_ma, 1),
+            'limited_frames': self.limited_frames
+        }
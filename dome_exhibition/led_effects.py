@@ -0,0 +1,157 @@
+import math
+from array import array
+
+import led_controller
+import sequence_codec
+from led_correction import SCALE_TABLES
+
+# --- Lookup tables, built once at import ---
+
+
+def _easing_table(curve):
+    """Sample an easing curve on [0, 1] into 256 levels (0-255)."""
+    return array('B', (round(curve(i / 255) * 255) for i in range(256)))
+
+
+EASING = {
+    'linear': _easing_table(lambda x: x),
+    'ease_in': _easing_table(lambda x: x * x),
+    'ease_out': _easing_table(lambda x: 1 - (1 - x) ** 3),
+    'ease_in_out': _easing_table(lambda x: 0.5 - 0.5 * math.cos(math.pi * x)),
+}
+
+
+def scale_frame(frame, level):
+    """Return the frame with every colour channel scaled by level / 255."""
+    if level >= 255:
+        return frame
+    return array('I', frame.tobytes().translate(SCALE_TABLES[max(level, 0)]))
+
+
+def eased(easing, progress):
+    """Look up an easing table at progress 0.0-1.0, result 0-255."""
+    progress = min(max(progress, 0.0), 1.0)
+    return EASING[easing][int(progress * 255)]
+
+
+def wheel(position):
+    """Rainbow colour for a position 0-255: red -> green -> blue -> red."""
+    position &= 255
+    if position < 85:
+        return led_controller.Color(255 - position * 3, position * 3, 0)
+    if position < 170:
+        position -= 85
+        return led_controller.Color(0, 255 - position * 3, position * 3)
+    position -= 170
+    return led_controller.Color(position * 3, 0, 255 - position * 3)
+
+
+def compose_zones(levels):
+    """
+    Frame with every palette zone in its own colour at its own level.
+    Parameter:
+        levels (list): One level 0-255 per zone, in sequence_codec.PALETTE order.
+    """
+    frame = array('I', [led_controller.OFF_COLOR]) * led_controller.LED_COUNT
+    for index, level in enumerate(levels):
+        if level <= 0:
+            continue
+        zone_name = sequence_codec.PALETTE[index]
+        scaled = scale_frame(led_controller.zone_frame(1 << index), level)
+        for start, end in led_controller.ZONES[zone_name]:
+            frame[start:end] = scaled[start:end]
+    return frame
+
+
+# --- Effects ---
+# An effect is any object with render(t) returning a full frame for t
+# seconds after it started, and a duration in seconds (None = endless).
+
+class Fade:
+    """Fade the zones in mask in (or out) over duration seconds."""
+
+    def __init__(self, mask, duration=1.0, easing='ease_in_out', fade_out=False):
+        self.mask = mask
+        self.duration = duration
+        self.easing = easing
+        self.fade_out = fade_out
+        self.base = led_controller.zone_frame(mask)
+
+    def render(self, t):
+        progress = t / self.duration
+        if self.fade_out:
+            progress = 1.0 - progress
+        return scale_frame(self.base, eased(self.easing, progress))
+
+
+class Pulse:
+    """
+    Breathe every zone up and down. Each zone has its own easing curve and
+    starts a quarter period after the previous one.
+    """
+
+    def __init__(self, period=2.0, easings=('ease_in_out', 'ease_in', 'ease_out', 'linear'), duration=None):
+        self.period = period
+        self.easings = easings
+        self.duration = duration
+
+    def render(self, t):
+        levels = []
+        for index in range(len(sequence_codec.PALETTE)):
+            phase = (t / self.period + index / 4) % 1.0
+            triangle = phase * 2 if phase < 0.5 else 2 - phase * 2
+            levels.append(eased(self.easings[index % len(self.easings)], triangle))
+        return compose_zones(levels)
+
+
+class RainbowChase:
+    """Rainbow spread over the whole strip, rotating speed LEDs per second."""
+
+    def __init__(self, speed=40.0, duration=None):
+        self.speed = speed
+        self.duration = duration
+        count = led_controller.LED_COUNT
+        self.row = array('I', (wheel(i * 256 // count) for i in range(count)))
+
+    def render(self, t):
+        offset = int(t * self.speed) % len(self.row)
+        return self.row[offset:] + self.row[:offset]
+
+
+class ZoneCycle:
+    """Fade each zone in and out in turn, step seconds per zone."""
+
+    def __init__(self, step=1.5, easing='ease_in_out', duration=None):
+        self.step = step
+        self.easing = easing
+        self.duration = duration
+
+    def render(self, t):
+        zones = len(sequence_codec.PALETTE)
+        index = int(t / self.step) % zones
+        progress = (t % self.step) / self.step
+        triangle = progress * 2 if progress < 0.5 else 2 - progress * 2
+        levels = [0] * zones
+        levels[index] = eased(self.easing, triangle)
+        return compose_zones(levels)
+
+
+class AttractLoop:
+    """Endless playlist of (effect, seconds) shown while nobody is playing."""
+
+    def __init__(self, playlist=None):
+        self.playlist = playlist or [
+            (RainbowChase(), 10.0),
+            (Pulse(), 8.0),
+            (ZoneCycle(), 6.0),
+        ]
+        self.total = sum(seconds for _, seconds in self.playlist)
+        self.duration = None
+
+    def render(self, t):
+        t %= self.total
+        for effect, seconds in self.playlist:
+            if t < seconds:
+                return effect.render(t)
+            t -= seconds
+        return self.playlist[-1][0].render(0.0)
@@ -0,0 +1,305 @@
+import heapq
+import itertools
+import logging
+import threading
+import time
+
+import led_controller
+import led_timeline
+import metrics
+import sequence_codec
+import sequence_timing
+
+log = logging.getLogger('led_renderer')
+
+# --- Renderer Configuration ---
+FRAME_RATE = 60          # Ticks per second while a job is running
+QUEUE_SIZE = 8           # Maximum number of jobs waiting for the strip
+IDLE_DELAY = 30.0        # Seconds without game activity before the idle effect starts
+WAKE_GRACE = 5.0         # wake() leaves the dome alone this long after game activity
+
+# Job priorities, a lower number wins.
+# A waiting job with a higher priority preempts the running job on the next
+# frame tick. Jobs with the same priority never preempt each other, they are
+# played in the order they were submitted.
+PRIORITY_GAME = 0
+PRIORITY_TEST = 1
+PRIORITY_EFFECT = 2
+
+
+class RenderJob:
+    """
+    Frames to show on the strip at fixed offsets from the start of the job,
+    or an animated effect (see led_effects) drawn every frame tick.
+    Parameter:
+        edges (list): [(offset_seconds, frame), ...] in time order, a frame is
+            a full array of LED_COUNT colours. The last edge marks the end.
+        effect: Object with render(t) -> frame, used when edges is None.
+        duration (float): How long the effect runs, in seconds.
+        priority (int): One of the PRIORITY_* constants.
+        on_done (callable): Called with the job once it has finished or
+            was preempted. Runs on the renderer thread.
+        on_start (callable): Called with the job when the renderer has
+            picked its start time (started_at), before the first frame.
+        lead (float): Seconds between picking the start time and the first
+            frame, so on_start can tell the phones before the dome lights up.
+    """
+
+    def __init__(self, edges, priority=PRIORITY_GAME, on_done=None, name='', effect=None, duration=0.0):
+        self.edges = edges
+        self.effect = effect
+        self.duration = duration
+        self.priority = priority
+        self.on_done = on_done
+        self.name = name
+        self.on_start = None
+        self.lead = 0.0
+        self.submitted_at = time.monotonic()
+        self.started_at = None
+        self.preempted = False
+
+    @classmethod
+    def from_timeline(cls, timeline, priority=PRIORITY_GAME, on_done=None, name=''):
+        """Job that blits the cached zone frames of a compiled Timeline."""
+        edges = [(offset, led_controller.zone_frame(mask, color_index))
+                 for offset, mask, color_index in timeline.events()]
+        return cls(edges, priority, on_done, name)
+
+    @classmethod
+    def from_effect(cls, effect, duration, priority=PRIORITY_EFFECT, on_done=None, name='effect'):
+        return cls(None, priority, on_done, name, effect=effect, duration=duration)
+
+
+class LEDRenderer:
+    """
+    Long-lived thread that owns the LED strip.
+    Every other part of the program submits jobs instead of touching the
+    strip, so only one sequence is ever drawn at a time.
+    When the queue is empty and no game activity was reported with touch()
+    for idle_delay seconds, the idle effect (the attract loop) is drawn at
+    the frame rate until the next job arrives.
+    """
+
+    def __init__(self, frame_rate=FRAME_RATE, queue_size=QUEUE_SIZE, idle_delay=IDLE_DELAY):
+        self.frame_interval = 1.0 / frame_rate
+        self.queue_size = queue_size
+        self._queue = []
+        self._counter = itertools.count()
+        self._cond = threading.Condition()
+        self._running = False
+        self._thread = None
+        self.current_job = None
+        self.jitter = sequence_timing.JitterStats()
+        self.idle_effect = None
+        self.idle_delay = idle_delay
+        self._last_activity = time.monotonic()
+        self._idle_started = None
+        self._next_idle_frame = 0.0
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name='led-renderer', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def submit(self, job):
+        """
+        Queue a job for the strip.
+        Returns False when the queue is full, the job is then dropped.
+        """
+        with self._cond:
+            if len(self._queue) >= self.queue_size:
+                return False
+            heapq.heappush(self._queue, (job.priority, job.submitted_at, next(self._counter), job))
+            self._cond.notify_all()
+        return True
+
+    def submit_timeline(self, timeline, priority=PRIORITY_GAME, on_done=None, name='timeline',
+                        on_start=None, lead=0.0):
+        job = RenderJob.from_timeline(timeline, priority, on_done, name)
+        job.on_start = on_start
+        job.lead = lead
+        return self.submit(job)
+
+    def submit_sequence(self, sequence, light_duration_per_color, off_duration_between_colors,
+                        priority=PRIORITY_GAME, on_done=None):
+        timeline = led_timeline.build_timeline(sequence, light_duration_per_color, off_duration_between_colors)
+        return self.submit_timeline(timeline, priority, on_done, name=str(sequence))
+
+    def submit_frame(self, pixels, hold, priority=PRIORITY_GAME, on_done=None):
+        edges = [(0.0, pixels), (hold, led_controller.zone_frame(0))]
+        return self.submit(RenderJob(edges, priority, on_done, name='frame'))
+
+    def submit_effect(self, effect, duration, priority=PRIORITY_EFFECT, on_done=None):
+        return self.submit(RenderJob.from_effect(effect, duration, priority, on_done))
+
+    def set_idle_effect(self, effect):
+        """Effect drawn while nothing is playing, None to keep the dome dark."""
+        with self._cond:
+            self.idle_effect = effect
+            self._cond.notify_all()
+
+    def touch(self):
+        """Report game activity; holds the idle effect back for idle_delay seconds."""
+        with self._cond:
+            self._last_activity = time.monotonic()
+            self._cond.notify_all()
+
+    def wake(self):
+        """
+        Start the idle effect now instead of after idle_delay, e.g. when a
+        visitor walks up. Ignored while a game is using the dome.
+        """
+        with self._cond:
+            now = time.monotonic()
+            if self._queue or self.current_job is not None or now - self._last_activity < WAKE_GRACE:
+                return False
+            self._last_activity = min(self._last_activity, now - self.idle_delay)
+            self._cond.notify_all()
+        return True
+
+    def prewarm(self):
+        """Build the cached frames of every single zone so the first sequence starts on time."""
+        led_controller.zone_frame(0)
+        for symbol in range(len(sequence_codec.PALETTE)):
+            led_controller.zone_frame(1 << symbol, symbol)
+
+    def pending(self):
+        with self._cond:
+            return len(self._queue)
+
+    # --- Renderer thread ---
+    def _run(self):
+        while True:
+            job = None
+            with self._cond:
+                while self._running and not self._queue:
+                    wait = self._idle_wait()
+                    if wait == 0:
+                        break
+                    self._cond.wait(wait)
+                if not self._running:
+                    break
+                if self._queue:
+                    job = heapq.heappop(self._queue)[-1]
+
+            if job is None:
+                self._render_idle_frame()
+                continue
+            self._idle_started = None
+            self.current_job = job
+            self._play(job)
+            self.current_job = None
+            with self._cond:
+                self._last_activity = time.monotonic()
+        led_controller.show_zone_frame(None)
+
+    def _idle_wait(self):
+        """
+        Seconds to wait before the next idle frame, 0 to draw it now, or
+        None to sleep until a job arrives. Called with the lock held.
+        """
+        if self._idle_started is not None and (
+                self.idle_effect is None or time.monotonic() < self._last_activity + self.idle_delay):
+            return 0    # Idle effect showing but no longer wanted: turn it off now
+        if self.idle_effect is None:
+            return None
+        now = time.monotonic()
+        start_at = self._last_activity + self.idle_delay
+        if now < start_at:
+            return start_at - now
+        if self._idle_started is None:
+            return 0
+        return max(self._next_idle_frame - now, 0)
+
+    def _render_idle_frame(self):
+        now = time.monotonic()
+        effect = self.idle_effect
+        if effect is None or now < self._last_activity + self.idle_delay:
+            # Idle effect removed, or game activity since it started
+            self._idle_started = None
+            led_controller.show_zone_frame(None)
+            return
+        if self._idle_started is None:
+            self._idle_started = now
+            self._next_idle_frame = now
+        with metrics.led_frame_render_seconds.time('idle'):
+            frame = effect.render(now - self._idle_started)
+        led_controller.show_pixels(frame)
+        self._next_idle_frame += self.frame_interval
+        if self._next_idle_frame < now:
+            # Fell behind by more than a frame, do not try to catch up
+            self._next_idle_frame = now + self.frame_interval
+
+    def _should_preempt(self, job):
+        with self._cond:
+            if not self._running:
+                return True
+            return bool(self._queue) and self._queue[0][0] < job.priority
+
+    def _wait_until(self, deadline, job):
+        """Sleep until the deadline in frame-sized slices, False if preempted."""
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return True
+            if self._should_preempt(job):
+                return False
+            time.sleep(min(remaining, self.frame_interval))
+
+    def _play(self, job):
+        job.started_at = time.monotonic() + job.lead
+        if job.on_start is not None:
+            try:
+                job.on_start(job)
+            except Exception:
+                log.exception("LED任务开始回调出错: %s", job.name)
+        if job.edges is None:
+            self._play_effect(job)
+        else:
+            self._play_edges(job)
+        if job.on_done is not None:
+            try:
+                job.on_done(job)
+            except Exception:
+                log.exception("LED任务回调出错: %s", job.name)
+
+    def _play_effect(self, job):
+        frame_number = 0
+        while True:
+            deadline = job.started_at + frame_number * self.frame_interval
+            if deadline - job.started_at >= job.duration:
+                break
+            if not self._wait_until(deadline, job):
+                job.preempted = True
+                log.info("LED任务被抢占: %s", job.name)
+                break
+            now = time.monotonic()
+            with metrics.led_frame_render_seconds.time('effect'):
+                frame = job.effect.render(now - job.started_at)
+            led_controller.show_pixels(frame)
+            # Skip frames we are already too late for instead of bunching them
+            frame_number = max(frame_number + 1, int((now - job.started_at) / self.frame_interval) + 1)
+        led_controller.show_zone_frame(None)
+
+    def _play_edges(self, job):
+        for offset, frame in job.edges:
+            deadline = job.started_at + offset
+            if not self._wait_until(deadline, job):
+                job.preempted = True
+                log.info("LED任务被抢占: %s", job.name)
+                led_controller.show_zone_frame(None)
+                break
+            led_controller.show_pixels(frame)
+            lateness = time.monotonic() - deadline
+            self.jitter.record(lateness)
+            metrics.led_edge_lateness_seconds.observe(lateness, 'renderer')
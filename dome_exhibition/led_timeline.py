@@ -0,0 +1,69 @@
+from array import array
+from functools import lru_cache
+
+import sequence_codec
+import sequence_timing
+
+
+class Timeline:
+    """
+    A sequence compiled once into flat arrays of LED events.
+    Event i happens offsets[i] seconds after the start and shows the zones
+    set in masks[i] (bit n = sequence_codec.PALETTE[n]) in colour colors[i]
+    (a palette index, -1 when everything is off). The last event turns the
+    dome off at `duration`.
+    """
+    __slots__ = ('offsets', 'masks', 'colors', 'duration')
+
+    def __init__(self, offsets, masks, colors, duration):
+        self.offsets = offsets
+        self.masks = masks
+        self.colors = colors
+        self.duration = duration
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def events(self):
+        return zip(self.offsets, self.masks, self.colors)
+
+    def to_dict(self):
+        """Compact form sent to the browser so it can animate with the dome."""
+        return {
+            'offsets_ms': [round(offset * 1000) for offset in self.offsets],
+            'masks': self.masks.tolist(),
+            'colors': self.colors.tolist(),
+            'duration_ms': round(self.duration * 1000)
+        }
+
+
+def build_timeline(sequence, light_duration_per_color, off_duration_between_colors):
+    """
+    Compile a list of colour names: each colour is lit, then everything is
+    off for the pause before the next colour.
+    """
+    offsets = array('d')
+    masks = array('B')
+    colors = array('b')
+    t = 0.0
+    for color_name in sequence:
+        symbol = sequence_codec.SYMBOLS[color_name]
+        offsets.append(t)
+        masks.append(1 << symbol)
+        colors.append(symbol)
+        t += light_duration_per_color
+        offsets.append(t)
+        masks.append(0)
+        colors.append(-1)
+        t += off_duration_between_colors
+    offsets.append(t)
+    masks.append(0)
+    colors.append(-1)
+    return Timeline(offsets, masks, colors, t)
+
+
+@lru_cache(maxsize=64)
+def compile_level(code, level):
+    """Timeline of a packed sequence played with the timing of the given level."""
+    light_duration, off_duration = sequence_timing.level_timing(level)
+    return build_timeline(sequence_codec.decode(code), light_duration, off_duration)
@@ -0,0 +1,385 @@
+#!/usr/bin/env python3
+"""
+Load test for the dome server
+Simulates many phones at once to find how many visitors the server can
+hold. Start the server first, for example:
+
+    LED_BACKEND=simulator DOME_ASYNC_MODE=eventlet python3 app.py
+    python3 load_test.py --url http://raspberrypi.local:5000 --clients 500
+
+or let the script start a local server on the simulated LED backend
+(plain Linux box, no Pi needed):
+
+    python3 load_test.py --spawn --mode multi --clients 200
+
+With --batch-ms 0 the spawned server sends every room update on its own
+(no room_batch); run both ways to compare the frames received per client.
+For --mode multi --clients 16 --room-size 8 that was 1102 frames (68.9 per
+client) with --batch-ms 0 and 362 (22.6 per client) with the default 30.
+
+Modes:
+    connections  every client connects, registers, joins a room and stays connected
+    multi        full multiplayer games: register_user, join_room, set_ready,
+                 start_game, then submit_answer on every level until game_over
+    single       single-player through the REST API (/api/game/start, /check,
+                 /sequence) with its own cookie jar, answering every level correctly
+
+Reports p50/p99 latency per step and throughput. Cross-talk counts a client
+seeing another room's players (multi) or another session's sequence (single).
+
+Requires python-socketio with the asyncio client (pip install "python-socketio[asyncio_client]").
+"""
+
+import argparse
+import asyncio
+import os
+import signal
+import subprocess
+import sys
+import time
+from urllib.parse import urlsplit
+
+import aiohttp
+import socketio
+
+# Server events the multiplayer clients listen to
+MULTI_EVENTS = ('update_players', 'join_denied', 'game_started', 'game_update',
+                'write_messageBox', 'update_score', 'game_over', 'room_batch')
+# Events kept for later when they arrive while waiting for something else
+# (with a full LED queue, ready_for_input can come before game_started)
+DEFERRED_EVENTS = ('game_update', 'game_over')
+
+
+def percentile(values, fraction):
+    """Return the value at the given fraction (0-1) of the sorted list."""
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def new_results():
+    return {'completed': 0, 'failed': 0, 'cross_talk': 0, 'messages': 0,
+            'received': {}, 'latency': {}, 'errors': {}}
+
+
+def record(results, step, seconds):
+    results['latency'].setdefault(step, []).append(seconds)
+
+
+def record_error(results, e):
+    results['failed'] += 1
+    results['errors'][type(e).__name__] = results['errors'].get(type(e).__name__, 0) + 1
+
+
+class Player:
+    """
+    One phone in a multiplayer game. The player list is kept in
+    self.players from update_players and room_batch (applied like
+    multi.html does), and the script waits for a condition on it with
+    wait_players(). Every other server event is queued so the script can
+    wait for the next one it cares about; a room_batch message is queued
+    as the write_messageBox it stands for.
+    """
+
+    def __init__(self, args, results, room_index, seat):
+        self.args = args
+        self.results = results
+        self.room = f"load_room_{room_index}"
+        self.prefix = f"load_{room_index}_"
+        self.username = f"{self.prefix}{seat}"
+        self.host = seat == 0
+        self.client = socketio.AsyncClient(reconnection=False)
+        self.inbox = asyncio.Queue()
+        self.deferred = []
+        self.players = {}
+        self.players_host = None
+        self.players_changed = asyncio.Condition()
+        self.denied = None
+        for event in MULTI_EVENTS:
+            self.client.on(event, self._handler(event))
+
+    def _handler(self, event):
+        async def handler(data=None):
+            self.results['messages'] += 1
+            received = self.results['received']
+            received[event] = received.get(event, 0) + 1
+            if event == 'room_batch':
+                if 'players' in data or 'removed' in data or 'host' in data:
+                    self.players.update(data.get('players', {}))
+                    for name in data.get('removed', ()):
+                        self.players.pop(name, None)
+                    self.players_host = data.get('host', self.players_host)
+                    await self._players_changed()
+                if 'message' in data:
+                    await self.inbox.put(('write_messageBox', {'message': data['message']}))
+                return
+            if event == 'update_players':
+                self.players = dict(data['players'])
+                self.players_host = data['host']
+                await self._players_changed()
+                return
+            if event == 'join_denied':
+                self.denied = data
+                await self._players_changed()
+            await self.inbox.put((event, data))
+        return handler
+
+    async def _players_changed(self):
+        if any(not name.startswith(self.prefix) for name in self.players):
+            self.results['cross_talk'] += 1
+        async with self.players_changed:
+            self.players_changed.notify_all()
+
+    async def wait_players(self, predicate, timeout=None):
+        """Wait until predicate(players) holds for the latest player list."""
+        def done():
+            if self.denied is not None:
+                raise RuntimeError(f"join denied: {self.denied}")
+            return predicate(self.players)
+
+        async with self.players_changed:
+            await asyncio.wait_for(self.players_changed.wait_for(done), timeout or self.args.timeout)
+
+    async def emit(self, event, data):
+        self.results['messages'] += 1
+        await self.client.emit(event, data)
+
+    async def wait_for(self, events, predicate=None, timeout=None):
+        """Return (event, data) of the next matching event, skipping the others."""
+        def matches(event, data):
+            return event in events and (predicate is None or predicate(data))
+
+        for index, (event, data) in enumerate(self.deferred):
+            if matches(event, data):
+                del self.deferred[index]
+                return event, data
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + (timeout or self.args.timeout)
+        while True:
+            event, data = await asyncio.wait_for(self.inbox.get(), deadline - loop.time())
+            if event == 'join_denied':
+                raise RuntimeError(f"join denied: {data}")
+            if matches(event, data):
+                return event, data
+            if event in DEFERRED_EVENTS:
+                self.deferred.append((event, data))
+
+    async def play(self):
+        args = self.args
+        started = time.perf_counter()
+        await self.client.connect(args.url, transports=['websocket'], wait_timeout=args.timeout)
+        record(self.results, 'connect', time.perf_counter() - started)
+
+        await self.emit('register_user', {'username': self.username, 'sid': self.client.sid})
+        sent = time.perf_counter()
+        await self.emit('join_room', {'username': self.username, 'room': self.room})
+        await self.wait_players(lambda players: self.username in players)
+        record(self.results, 'join_room', time.perf_counter() - sent)
+
+        # Ready once the whole room is there; the host starts once everyone is ready
+        await self.wait_players(lambda players: len(players) >= args.room_size, timeout=args.round_timeout)
+        sent = time.perf_counter()
+        await self.emit('set_ready', {'username': self.username, 'room': self.room})
+        await self.wait_players(lambda players: players.get(self.username, {}).get('ready'))
+        record(self.results, 'set_ready', time.perf_counter() - sent)
+        if self.host:
+            await self.wait_players(lambda players: len(players) >= args.room_size and all(
+                player['ready'] for player in players.values()), timeout=args.round_timeout)
+            sent = time.perf_counter()
+            await self.emit('start_game', {'username': self.username, 'room': self.room})
+            await self.wait_for(('game_started',))
+            record(self.results, 'start_game', time.perf_counter() - sent)
+        else:
+            await self.wait_for(('game_started',), timeout=args.round_timeout)
+
+        game_started = time.perf_counter()
+        while True:
+            # The answer is accepted once the dome has shown the sequence
+            event, data = await self.wait_for(
+                ('game_update', 'game_over'),
+                lambda data: 'scores' in data or data.get('status') == 'ready_for_input',
+                timeout=args.round_timeout)
+            if event == 'game_over':
+                break
+            sent = time.perf_counter()
+            await self.emit('submit_answer', {'username': self.username, 'room': self.room,
+                                              'answer': data['sequence']})
+            await self.wait_for(('write_messageBox',))
+            record(self.results, 'submit_answer', time.perf_counter() - sent)
+        record(self.results, 'game', time.perf_counter() - game_started)
+        self.results['completed'] += 1
+
+
+async def play_multi(index, args, results):
+    """One player of a multiplayer room; rooms fill up with consecutive clients."""
+    player = Player(args, results, index // args.room_size, index % args.room_size)
+    try:
+        await player.play()
+    except Exception as e:
+        record_error(results, e)
+    finally:
+        if player.client.connected:
+            await player.client.disconnect()
+
+
+async def hold_connection(index, args, results):
+    """Connect one client, register and join a room, then stay connected."""
+    client = socketio.AsyncClient(reconnection=False)
+    username = f"load_{index}"
+    room = f"load_room_{index // args.room_size}"
+    started = time.perf_counter()
+    try:
+        await client.connect(args.url, transports=['websocket'], wait_timeout=args.timeout)
+        record(results, 'connect', time.perf_counter() - started)
+        await client.emit('register_user', {'username': username})
+        await client.emit('join_room', {'username': username, 'room': room})
+        results['messages'] += 2
+        results['completed'] += 1
+        await asyncio.sleep(args.hold)
+    except Exception as e:
+        record_error(results, e)
+    finally:
+        if client.connected:
+            await client.disconnect()
+
+
+async def timed_request(http, results, step, method, url, **kwargs):
+    sent = time.perf_counter()
+    async with http.request(method, url, **kwargs) as response:
+        data = await response.json()
+    record(results, step, time.perf_counter() - sent)
+    results['messages'] += 1
+    return data
+
+
+async def play_single(index, args, results):
+    """Play a few single-player levels with the correct answer every time."""
+    started = time.perf_counter()
+    try:
+        async with aiohttp.ClientSession(cookie_jar=aiohttp.CookieJar(unsafe=True)) as http:
+            data = await timed_request(http, results, 'api/game/start', 'POST', f"{args.url}/api/game/start",
+                                       json={'playerName': f"load_{index}"})
+            sequence = data['sequence']
+            for level in range(1, args.levels + 1):
+                result = await timed_request(http, results, 'api/game/check', 'POST',
+                                             f"{args.url}/api/game/check", json={'playerSequence': sequence})
+                if result.get('result') != 'correct':
+                    results['cross_talk'] += 1
+                    return
+                if level == args.levels:
+                    break
+                data = await timed_request(http, results, 'api/game/sequence', 'GET',
+                                           f"{args.url}/api/game/sequence", params={'level': result['nextLevel']})
+                sequence = data['sequence']
+        results['completed'] += 1
+        record(results, 'game', time.perf_counter() - started)
+    except Exception as e:
+        record_error(results, e)
+
+
+WORKERS = {'connections': hold_connection, 'multi': play_multi, 'single': play_single}
+
+
+async def run(args):
+    results = new_results()
+    worker = WORKERS[args.mode]
+    tasks = []
+    delay = args.ramp / args.clients if args.clients else 0
+    started = time.perf_counter()
+    for i in range(args.clients):
+        tasks.append(asyncio.create_task(worker(i, args, results)))
+        await asyncio.sleep(delay)
+    await asyncio.gather(*tasks)
+    results['elapsed'] = time.perf_counter() - started
+    return results
+
+
+async def wait_for_server(url, timeout):
+    """Poll the server until it answers HTTP, for --spawn."""
+    deadline = time.monotonic() + timeout
+    async with aiohttp.ClientSession() as http:
+        while True:
+            try:
+                async with http.get(f"{url}/mode_selection") as response:
+                    await response.read()
+                    return
+            except aiohttp.ClientError:
+                if time.monotonic() > deadline:
+                    raise
+                await asyncio.sleep(0.5)
+
+
+def spawn_server(args):
+    """Start app.py next to this script on the simulated LED backend."""
+    env = dict(os.environ, LED_BACKEND='simulator', DOME_ASYNC_MODE=args.async_mode,
+               LOG_LEVEL=os.environ.get('LOG_LEVEL', 'WARNING'))
+    if args.batch_ms is not None:
+        env['DOME_EMIT_BATCH_MS'] = str(args.batch_ms)
+    env['DOME_PORT'] = str(urlsplit(args.url).port or 5000)
+    here = os.path.dirname(os.path.abspath(__file__))
+    # Own process group: debug mode runs the app in a reloader child process
+    server = subprocess.Popen([sys.executable, 'app.py'], cwd=here, env=env, start_new_session=True)
+    ready = False
+    try:
+        asyncio.run(wait_for_server(args.url, 30.0))
+        ready = True
+    finally:
+        if not ready:
+            stop_server(server)
+    return server
+
+
+def stop_server(server):
+    try:
+        os.killpg(server.pid, signal.SIGTERM)
+    except ProcessLookupError:
+        pass    # Already exited, e.g. it failed to start
+    server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Dome server load test")
+    parser.add_argument('--url', default='http://127.0.0.1:5000')
+    parser.add_argument('--mode', choices=list(WORKERS), default='connections')
+    parser.add_argument('--levels', type=int, default=3, help="levels per single-player game")
+    parser.add_argument('--clients', type=int, default=200, help="number of concurrent clients")
+    parser.add_argument('--room-size', type=int, default=4, help="players per room")
+    parser.add_argument('--ramp', type=float, default=10.0, help="seconds to open all connections")
+    parser.add_argument('--hold', type=float, default=20.0, help="seconds each client stays connected")
+    parser.add_argument('--timeout', type=float, default=10.0, help="timeout of a single reply in seconds")
+    parser.add_argument('--round-timeout', type=float, default=120.0,
+                        help="seconds to wait for other players and for the dome to show a sequence")
+    parser.add_argument('--spawn', action='store_true', help="start a local server on the simulated LED backend")
+    parser.add_argument('--async-mode', default='threading', help="DOME_ASYNC_MODE of the spawned server")
+    parser.add_argument('--batch-ms', type=int,
+                        help="DOME_EMIT_BATCH_MS of the spawned server, 0 turns room_batch off")
+    args = parser.parse_args()
+
+    server = spawn_server(args) if args.spawn else None
+    try:
+        print(f"=== Load test ({args.mode}): {args.clients} clients against {args.url} ===")
+        results = asyncio.run(run(args))
+    finally:
+        if server is not None:
+            stop_server(server)
+
+    label = {'connections': "Connected", 'multi': "Completed players", 'single': "Completed games"}[args.mode]
+    print(f"{label}: {results['completed']} / {args.clients}")
+    if args.mode != 'connections':
+        print(f"Cross-talk: {results['cross_talk']}")
+    print(f"Failed: {results['failed']} {results['errors']}")
+    elapsed = results['elapsed']
+    print(f"Elapsed: {elapsed:.1f} s, throughput: {results['messages'] / elapsed:.1f} messages/s, "
+          f"{results['completed'] / elapsed:.2f} completed/s")
+    if results['received']:
+        frames = sum(results['received'].values())
+        print(f"Frames received: {frames} ({frames / max(args.clients, 1):.1f} per client) "
+              f"{dict(sorted(results['received'].items()))}")
+    for step, latency in results['latency'].items():
+        print(f"{step:>20}: n={len(latency):<6} p50 {percentile(latency, 0.5) * 1000:8.1f} ms, "
+              f"p99 {percentile(latency, 0.99) * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
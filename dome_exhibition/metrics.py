@@ -0,0 +1,218 @@
+import bisect
+import math
+import threading
+import time
+from collections import deque
+
+# --- Metrics Configuration ---
+# Bucket upper bounds in seconds, from sub-millisecond LED work to slow handlers
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+                   0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+DRAIN_THRESHOLD = 4096        # Pending observations before the writer folds them in itself
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _format_labels(labelnames, labelvalues, extra=()):
+    pairs = list(zip(labelnames, labelvalues)) + list(extra)
+    if not pairs:
+        return ''
+    body = ','.join('{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+                    for name, value in pairs)
+    return '{' + body + '}'
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+class _Metric:
+    """
+    Base of every metric: a name, help text and children per label values.
+    Recording never takes a lock: an observation is one deque.append(),
+    which is atomic in CPython, and the pending values are folded into the
+    totals when /metrics is scraped (or when too many have piled up).
+    """
+    kind = 'untyped'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._pending = deque()
+        self._lock = threading.Lock()
+
+    def _record(self, labels, value):
+        self._pending.append((labels, value))
+        if len(self._pending) > DRAIN_THRESHOLD:
+            self._drain()
+
+    def _drain(self):
+        with self._lock:
+            pending = self._pending
+            while pending:
+                try:
+                    labels, value = pending.popleft()
+                except IndexError:
+                    break
+                self._fold(labels, value)
+
+    def _fold(self, labels, value):
+        raise NotImplementedError
+
+    def _check(self, labels):
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {labels}")
+        return labels
+
+    def collect(self):
+        """Lines of the text exposition format for this metric."""
+        self._drain()
+        with self._lock:
+            return [f"# HELP {self.name} {self.documentation}",
+                    f"# TYPE {self.name} {self.kind}"] + self._samples()
+
+
+class Counter(_Metric):
+    """Monotonic total, e.g. events handled or messages emitted."""
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values = {}
+
+    def inc(self, *labels, amount=1):
+        self._record(self._check(labels), amount)
+
+    def _fold(self, labels, value):
+        self._values[labels] = self._values.get(labels, 0) + value
+
+    def value(self, *labels):
+        self._drain()
+        return self._values.get(labels, 0)
+
+    def _samples(self):
+        return [f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+                for labels, value in sorted(self._values.items())]
+
+
+class Gauge(_Metric):
+    """
+    Current value. Either set() from the code or, with fn, read at scrape
+    time (e.g. fn=lambda: len(rooms)) so nothing is recorded at all.
+    """
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, fn=None):
+        super().__init__(name, documentation)
+        self.fn = fn
+        self._value = 0
+
+    def set(self, value):
+        self._value = value
+
+    def _fold(self, labels, value):
+        pass
+
+    def _samples(self):
+        value = self.fn() if self.fn is not None else self._value
+        return [f"{self.name} {_format_value(value)}"]
+
+
+class Histogram(_Metric):
+    """Distribution of durations (seconds) in cumulative buckets."""
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets) + (math.inf,)
+        self._counts = {}
+        self._sums = {}
+
+    def observe(self, value, *labels):
+        self._record(self._check(labels), value)
+
+    def time(self, *labels):
+        """Context manager observing the time spent in the block."""
+        return _Timer(self, labels)
+
+    def _fold(self, labels, value):
+        counts = self._counts.get(labels)
+        if counts is None:
+            counts = self._counts[labels] = [0] * len(self.buckets)
+            self._sums[labels] = 0.0
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        self._sums[labels] += value
+
+    def _samples(self):
+        lines = []
+        for labels, counts in sorted(self._counts.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket"
+                             f"{_format_labels(self.labelnames, labels, [('le', _format_value(bound))])}"
+                             f" {cumulative}")
+            label_text = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_text} {_format_value(self._sums[labels])}")
+            lines.append(f"{self.name}_count{label_text} {cumulative}")
+        return lines
+
+
+class _Timer:
+    __slots__ = ('histogram', 'labels', 'start')
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, *self.labels)
+        return False
+
+
+class Registry:
+    """Every metric of the process, rendered together for /metrics."""
+
+    def __init__(self):
+        self._metrics = {}
+
+    def register(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric already registered: {metric.name}")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, fn=None):
+        return self.register(Gauge(name, documentation, fn))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self):
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.collect())
+        return '\n'.join(lines) + '\n'
+
+
+# The registry of the process and the metrics shared by several modules
+registry = Registry()
+
+led_frame_render_seconds = registry.histogram(
+    'dome_led_frame_render_seconds', 'Time to render one effect frame', ['source'])
+led_show_seconds = registry.histogram(
+    'dome_led_show_seconds', 'Time to write a frame to the strip and latch it with show()')
+led_edge_lateness_seconds = registry.histogram(
+    'dome_led_edge_lateness_seconds', 'How late sequence edges fired after their deadline', ['source'])
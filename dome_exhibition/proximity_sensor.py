@@ -0,0 +1,224 @@
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+
+# Attempt to import pigpio for the HC-SR04.
+# The pigpio daemon timestamps GPIO edges itself (microsecond ticks) and
+# calls us back on its own thread, so an echo pulse is measured without
+# busy-waiting on the pin.
+try:
+    import pigpio
+    IS_PIGPIO_ENV = True
+except ImportError:
+    IS_PIGPIO_ENV = False
+
+log = logging.getLogger('proximity_sensor')
+
+# --- Sensor Configuration ---
+SENSOR_TRIGGER_PIN = 23       # Free since strip 2 moved to GPIO13
+SENSOR_ECHO_PIN = 24          # Through the 1kΩ/1kΩ divider, the echo is 5V
+SENSOR_RATE_HZ = 20           # Measurements per second
+SENSOR_MEDIAN_WINDOW = 5      # Readings in the median filter
+SENSOR_EMA_ALPHA = 0.3        # Weight of a new median in the moving average
+PRESENCE_NEAR_CM = 120.0      # A visitor is present below this distance...
+PRESENCE_FAR_CM = 160.0       # ...and gone again above this one
+MAX_RANGE_CM = 400.0          # Beyond the HC-SR04 range: nobody there
+ECHO_TIMEOUT = 0.03           # An echo of MAX_RANGE_CM takes about 23 ms
+SPEED_OF_SOUND_CM_S = 34300.0
+
+# Measurement source: 'pigpio' (real sensor), 'simulated' or 'none'
+SENSOR_SOURCE = os.environ.get('SENSOR_SOURCE', 'pigpio' if IS_PIGPIO_ENV else 'none')
+
+
+class PigpioSource:
+    """
+    HC-SR04 on two GPIO pins, read through the pigpio daemon.
+    trigger() sends the 10 µs trigger pulse; the echo pulse length is
+    measured from the tick of its rising and falling edge.
+    """
+
+    def __init__(self, trigger_pin=SENSOR_TRIGGER_PIN, echo_pin=SENSOR_ECHO_PIN):
+        self.trigger_pin = trigger_pin
+        self.echo_pin = echo_pin
+        self.on_echo = None
+        self._pi = None
+        self._callback = None
+        self._rise = None
+
+    def start(self, on_echo):
+        self.on_echo = on_echo
+        self._pi = pigpio.pi()
+        if not self._pi.connected:
+            raise RuntimeError("pigpio daemon not running, start it with 'sudo pigpiod'")
+        self._pi.set_mode(self.trigger_pin, pigpio.OUTPUT)
+        self._pi.write(self.trigger_pin, 0)
+        self._pi.set_mode(self.echo_pin, pigpio.INPUT)
+        self._callback = self._pi.callback(self.echo_pin, pigpio.EITHER_EDGE, self._edge)
+
+    def trigger(self):
+        self._rise = None
+        self._pi.gpio_trigger(self.trigger_pin, 10, 1)
+
+    def stop(self):
+        if self._callback is not None:
+            self._callback.cancel()
+        if self._pi is not None:
+            self._pi.stop()
+
+    def _edge(self, gpio, level, tick):
+        if level == 1:
+            self._rise = tick
+        elif level == 0 and self._rise is not None:
+            self.on_echo(pigpio.tickDiff(self._rise, tick) / 1000000.0)
+            self._rise = None
+
+
+class SimulatedSource:
+    """
+    Stand-in for the sensor off the Pi. Set distance_cm (None = nobody in
+    range) and every trigger() answers with the matching echo pulse, with
+    some measurement noise and the occasional lost echo.
+    """
+
+    def __init__(self, distance_cm=None, noise_cm=2.0, dropout=0.02):
+        self.distance_cm = distance_cm
+        self.noise_cm = noise_cm
+        self.dropout = dropout
+        self.on_echo = None
+
+    def start(self, on_echo):
+        self.on_echo = on_echo
+
+    def trigger(self):
+        distance = self.distance_cm
+        if distance is None or random.random() < self.dropout:
+            return
+        distance = max(2.0, distance + random.gauss(0.0, self.noise_cm))
+        self.on_echo(distance * 2 / SPEED_OF_SOUND_CM_S)
+
+    def stop(self):
+        pass
+
+
+def create_source(source):
+    """Build the measurement source for a name ('pigpio', 'simulated' or 'none')."""
+    if source == 'pigpio':
+        if not IS_PIGPIO_ENV:
+            raise RuntimeError("The 'pigpio' sensor source needs the pigpio module")
+        return PigpioSource()
+    if source == 'simulated':
+        return SimulatedSource()
+    if source == 'none':
+        return None
+    raise ValueError(f"Unknown sensor source: {source!r}")
+
+
+class ProximitySensor:
+    """
+    Samples the distance at a fixed rate on its own thread and turns it
+    into presence events.
+    Each raw reading goes through a median filter (drops single bad echoes)
+    and an exponential moving average; presence switches with hysteresis
+    between PRESENCE_NEAR_CM and PRESENCE_FAR_CM.
+    The thread sleeps between samples and only waits for the echo event,
+    so it never competes with the LED renderer for the CPU.
+    Parameter:
+        source: PigpioSource, SimulatedSource or anything with
+            start(on_echo), trigger() and stop().
+        rate_hz (float): Measurements per second.
+    """
+
+    def __init__(self, source, rate_hz=SENSOR_RATE_HZ, median_window=SENSOR_MEDIAN_WINDOW,
+                 ema_alpha=SENSOR_EMA_ALPHA, near_cm=PRESENCE_NEAR_CM, far_cm=PRESENCE_FAR_CM):
+        self.source = source
+        self.interval = 1.0 / rate_hz
+        self.ema_alpha = ema_alpha
+        self.near_cm = near_cm
+        self.far_cm = far_cm
+        self.readings = deque(maxlen=median_window)
+        self.distance_cm = None
+        self.present = False
+        self.samples = 0
+        self.timeouts = 0
+        self._listeners = []
+        self._echo = threading.Event()
+        self._pulse = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def add_listener(self, callback):
+        """callback(present, distance_cm) runs on the sensor thread when presence changes."""
+        self._listeners.append(callback)
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self.source.start(self._on_echo)
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='proximity-sensor', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.source.stop()
+
+    def stats(self):
+        return {
+            'present': self.present,
+            'distance_cm': None if self.distance_cm is None else round(self.distance_cm, 1),
+            'samples': self.samples,
+            'timeouts': self.timeouts
+        }
+
+    def _on_echo(self, pulse_seconds):
+        # Called on the source's callback thread
+        self._pulse = pulse_seconds
+        self._echo.set()
+
+    def _run(self):
+        next_sample = time.monotonic()
+        while not self._stop.is_set():
+            self._echo.clear()
+            self.source.trigger()
+            if self._echo.wait(ECHO_TIMEOUT):
+                distance = min(self._pulse * SPEED_OF_SOUND_CM_S / 2, MAX_RANGE_CM)
+            else:
+                self.timeouts += 1
+                distance = MAX_RANGE_CM
+            self.update(distance)
+
+            next_sample += self.interval
+            now = time.monotonic()
+            if next_sample < now:
+                next_sample = now
+            self._stop.wait(next_sample - now)
+
+    def update(self, distance):
+        """Feed one raw reading in cm; returns the filtered distance."""
+        self.samples += 1
+        self.readings.append(distance)
+        median = sorted(self.readings)[len(self.readings) // 2]
+        if self.distance_cm is None:
+            self.distance_cm = median
+        else:
+            self.distance_cm += self.ema_alpha * (median - self.distance_cm)
+
+        if not self.present and self.distance_cm < self.near_cm:
+            self._set_present(True)
+        elif self.present and self.distance_cm > self.far_cm:
+            self._set_present(False)
+        return self.distance_cm
+
+    def _set_present(self, present):
+        self.present = present
+        for callback in self._listeners:
+            try:
+                callback(present, self.distance_cm)
+            except Exception:
+                log.exception("距离传感器回调出错")
@@ -0,0 +1,127 @@
+import os
+import threading
+import time
+
+import metrics
+
+# --- Batching Configuration ---
+# Player list changes, scores and room messages emitted within this window
+# are sent to the room as one 'room_batch'. 0 sends every change at once as
+# update_players / write_messageBox, like older servers did.
+BATCH_WINDOW = int(os.environ.get('DOME_EMIT_BATCH_MS', '30')) / 1000
+
+room_batch_merged = metrics.registry.counter(
+    'dome_room_batch_merged_total', 'Room updates merged into a room_batch instead of sent on their own')
+
+
+class RoomBatcher:
+    """
+    Collects outbound room updates and sends them as one compact diff.
+    The first update for a room sets its deadline `window` seconds ahead;
+    what arrives before it is merged into a single 'room_batch':
+
+        {'players': {name: {'ready', 'score'}},   # only entries that changed
+         'removed': [name, ...],
+         'host': name,                             # only when it changed
+         'message': text}                          # last write_messageBox text
+
+    Missing keys mean "unchanged". Every other event to a room must go
+    through flush(room) first so the phones see updates in order.
+    One long-lived flusher task sends the batches, sleeping until the
+    earliest deadline; deadlines are kept in a dict in insertion order,
+    which with a fixed window is also deadline order.
+    Parameter:
+        socketio: The server's SocketIO, used to emit and to start the flusher.
+        window (float): Seconds to collect updates, 0 disables batching.
+    """
+
+    def __init__(self, socketio, window=BATCH_WINDOW):
+        self.socketio = socketio
+        self.window = window
+        self._lock = threading.Lock()
+        self._cond = threading.Condition(self._lock)
+        self._pending = {}      # room -> {'players': dict, 'host': str, 'message': str}
+        self._deadlines = {}    # room -> monotonic time to send, earliest first
+        self._sent = {}         # room -> ({name: (ready, score)}, host) last sent
+        self._flusher_started = False
+
+    def players(self, room, players, host):
+        """The player list of a room changed (joined, left, ready, score)."""
+        if not self.window:
+            self.socketio.emit('update_players', {'players': players, 'host': host}, to=room)
+            return
+        self._add(room, 'players', (players, host))
+
+    def message(self, room, text):
+        """Text for the message box of everyone in the room."""
+        if not self.window:
+            self.socketio.emit('write_messageBox', {'message': text}, to=room)
+            return
+        self._add(room, 'message', text)
+
+    def _add(self, room, kind, value):
+        start_flusher = False
+        with self._cond:
+            pending = self._pending.get(room)
+            if pending is None:
+                pending = self._pending[room] = {}
+                self._deadlines[room] = time.monotonic() + self.window
+                start_flusher = not self._flusher_started
+                self._flusher_started = True
+                self._cond.notify()
+            else:
+                room_batch_merged.inc()
+            pending[kind] = value
+        if start_flusher:
+            self.socketio.start_background_task(self._run)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    if self._deadlines:
+                        room, deadline = next(iter(self._deadlines.items()))
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            break
+                        self._cond.wait(remaining)
+                    else:
+                        self._cond.wait()
+            self.flush(room)
+
+    def flush(self, room):
+        """Send what is pending for the room now."""
+        with self._lock:
+            pending = self._pending.pop(room, None)
+            self._deadlines.pop(room, None)
+            if pending is None:
+                return
+            batch = {}
+            if 'players' in pending:
+                players, host = pending['players']
+                current = {name: (info['ready'], info['score']) for name, info in list(players.items())}
+                sent_players, sent_host = self._sent.get(room, ({}, None))
+                changed = {name: {'ready': ready, 'score': score}
+                           for name, (ready, score) in current.items() if sent_players.get(name) != (ready, score)}
+                removed = [name for name in sent_players if name not in current]
+                if changed:
+                    batch['players'] = changed
+                if removed:
+                    batch['removed'] = removed
+                if host != sent_host:
+                    batch['host'] = host
+                self._sent[room] = (current, host)
+            if 'message' in pending:
+                batch['message'] = pending['message']
+        if batch:
+            self.socketio.emit('room_batch', batch, to=room)
+
+    def pending(self, room):
+        return room in self._pending
+
+    def forget(self, room):
+        """The room is gone: drop what is pending and the last sent state."""
+        with self._lock:
+            self._pending.pop(room, None)
+            self._deadlines.pop(room, None)
+            self._sent.pop(room, None)
@@ -0,0 +1,66 @@
+# Shared colour codec for the server, the LED zones and the web pages.
+#
+# Every colour is a 2-bit symbol. A sequence is packed into one int with the
+# first colour in the lowest two bits and a sentinel 1 bit just above the
+# last colour, so the length is part of the value:
+#     ['red', 'blue']  ->  0b1_10_00  (sentinel, blue=2, red=0)
+# Two sequences are equal exactly when their codes are equal.
+
+# Symbol order; the LED zones are laid out on the strip in the same order
+PALETTE = ('red', 'yellow', 'blue', 'green')
+SYMBOLS = {name: index for index, name in enumerate(PALETTE)}
+
+EMPTY_CODE = 1
+
+
+def encode(sequence):
+    """Pack a list of colour names into an int. Raises ValueError for unknown colours."""
+    code = EMPTY_CODE
+    for name in reversed(sequence):
+        symbol = SYMBOLS.get(name)
+        if symbol is None:
+            raise ValueError(f"Unknown colour: {name!r}")
+        code = (code << 2) | symbol
+    return code
+
+
+def decode(code):
+    """Unpack an int made by encode() back into colour names."""
+    return [PALETTE[(code >> (2 * i)) & 3] for i in range(length(code))]
+
+
+def length(code):
+    """Number of colours packed in the code."""
+    return (code.bit_length() - 1) // 2
+
+
+def to_code(value):
+    """
+    Accept an answer either already packed (int) or as a list of colour
+    names, as older pages send it. Returns None if it cannot be decoded.
+    """
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, int):
+        return value if value >= EMPTY_CODE else None
+    if isinstance(value, (list, tuple)):
+        try:
+            return encode(value)
+        except (ValueError, TypeError):
+            return None
+    return None
+
+
+def first_mismatch(answer_code, target_code):
+    """
+    Compare two packed sequences in one step.
+    Returns -1 when they are equal, otherwise the index of the first colour
+    that differs (or the length of the shorter one if it is a prefix).
+    """
+    if answer_code == target_code:
+        return -1
+    if answer_code is None:
+        return 0
+    diff = answer_code ^ target_code
+    index = ((diff & -diff).bit_length() - 1) // 2
+    return min(index, length(answer_code), length(target_code))
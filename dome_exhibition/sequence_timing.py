@@ -0,0 +1,69 @@
+import time
+from collections import deque
+
+# level,light_duration_per_color,off_duration_between_colors
+level_duration_list = [
+    (1, 1, 0.5),
+    (2, 1, 0.49),
+    (3, 0.9, 0.48),
+    (4, 0.9, 0.47),
+    (5, 0.8, 0.46),
+    (6, 0.8, 0.45),
+    (7, 0.7, 0.44),
+    (8, 0.7, 0.43),
+    (9, 0.6, 0.42),
+    (10, 0.6, 0.41),
+    (11, 0.5, 0.40)
+]
+
+
+def level_timing(level):
+    """Return (light_duration_per_color, off_duration_between_colors) for a level."""
+    level = max(1, min(level, len(level_duration_list)))
+    return level_duration_list[level-1][1], level_duration_list[level-1][2]
+
+
+class JitterStats:
+    """Running record of how late edges fired compared to their deadline (seconds)."""
+
+    def __init__(self, window=256):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.last = 0.0
+        self.recent = deque(maxlen=window)
+
+    def record(self, lateness):
+        self.count += 1
+        self.total += lateness
+        self.last = lateness
+        if lateness > self.max:
+            self.max = lateness
+        self.recent.append(lateness)
+
+    def snapshot(self):
+        """Return the statistics in milliseconds, ready to be sent as JSON."""
+        recent = sorted(self.recent)
+        p95 = recent[min(len(recent) - 1, int(len(recent) * 0.95))] if recent else 0.0
+        return {
+            'edges': self.count,
+            'mean_ms': round(self.total / self.count * 1000, 3) if self.count else 0.0,
+            'max_ms': round(self.max * 1000, 3),
+            'last_ms': round(self.last * 1000, 3),
+            'p95_ms': round(p95 * 1000, 3)
+        }
+
+
+def server_time_ms(monotonic=None):
+    """
+    The clock shared with the phones, in milliseconds: time.monotonic(), so
+    it never jumps when the Pi corrects its wall clock.
+    """
+    return round((time.monotonic() if monotonic is None else monotonic) * 1000, 1)
+
+
+def sleep_until(deadline):
+    """Sleep until the given time.monotonic() deadline, if it is still ahead."""
+    remaining = deadline - time.monotonic()
+    if remaining > 0:
+        time.sleep(remaining)
@@ -0,0 +1,77 @@
+// Server clock and dome playback for the phones.
+//
+// createDomeClock() estimates the offset between this page and the server
+// clock NTP-style over Socket.IO ('clock_sync', see app.py): the reply with
+// the shortest round trip of a few probes wins, and it is refreshed every
+// 30 s. Times sent by the server ('sequence_playing') are in its clock, so
+// the page can light its buttons together with the dome and open input
+// the moment the LEDs finish, whatever the Wi-Fi latency.
+
+function createDomeClock(socket, samples = 5, resyncMs = 30000) {
+    let offset = 0;
+    let bestRtt = Infinity;
+    let synced = false;
+
+    function probe() {
+        return new Promise((resolve) => {
+            const t0 = performance.now();
+            socket.timeout(2000).emit('clock_sync', { t0 }, (err, reply) => {
+                const t3 = performance.now();
+                if (!err && reply) {
+                    const rtt = (t3 - t0) - (reply.t2 - reply.t1);
+                    if (rtt < bestRtt) {
+                        bestRtt = rtt;
+                        offset = ((reply.t1 - t0) + (reply.t2 - t3)) / 2;
+                        synced = true;
+                    }
+                }
+                resolve();
+            });
+        });
+    }
+
+    async function sync() {
+        bestRtt = Infinity;
+        for (let i = 0; i < samples; i++) {
+            await probe();
+        }
+        console.log(`clock synced: offset ${offset.toFixed(1)} ms, rtt ${bestRtt.toFixed(1)} ms`);
+    }
+
+    socket.on('connect', sync);
+    if (socket.connected) sync();
+    setInterval(() => { if (socket.connected) sync(); }, resyncMs);
+
+    return {
+        // Current server time in ms
+        now: () => performance.now() + offset,
+        // Milliseconds from now until the given server time (0 if it is past)
+        until: (serverMs) => Math.max(0, serverMs - (performance.now() + offset)),
+        get synced() { return synced; },
+        get rtt() { return bestRtt; }
+    };
+}
+
+// Light the colour buttons along a timeline (led_timeline.Timeline.to_dict)
+// that starts at startAt in server time, then call onEnd when the dome is
+// done. Returns a function that cancels the playback.
+function playTimeline(clock, palette, buttons, timeline, startAt, onEnd) {
+    const timers = [];
+    const show = (mask) => {
+        palette.forEach((color, index) => {
+            const btn = buttons[color];
+            if (btn) btn.classList.toggle('active', ((mask >> index) & 1) === 1);
+        });
+    };
+    timeline.offsets_ms.forEach((offset, i) => {
+        timers.push(setTimeout(() => show(timeline.masks[i]), clock.until(startAt + offset)));
+    });
+    timers.push(setTimeout(() => {
+        show(0);
+        onEnd();
+    }, clock.until(startAt + timeline.duration_ms)));
+    return () => {
+        timers.forEach(clearTimeout);
+        show(0);
+    };
+}
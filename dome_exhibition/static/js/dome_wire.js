@@ -0,0 +1,47 @@
+// Socket.IO connection with msgpack payloads when the decoder is loaded.
+//
+// connectDome() tells the server in the connect handshake that this page
+// can read msgpack (see wire_format.py); the server then sends the payload
+// of the big events (player lists, sequences, timelines) as one binary
+// msgpack attachment instead of JSON. Every handler registered with
+// socket.on() gets the decoded object either way, and socket.off() with the
+// same handler removes it, so the page code does not change. Without the
+// MessagePack script (or on an older server) everything stays JSON.
+
+function decodePayload(data) {
+    if (data instanceof ArrayBuffer) {
+        return MessagePack.decode(new Uint8Array(data));
+    }
+    if (ArrayBuffer.isView(data)) {
+        return MessagePack.decode(data);
+    }
+    return data;
+}
+
+function connectDome() {
+    const msgpack = typeof MessagePack !== 'undefined';
+    const socket = io({ auth: { msgpack } });
+    if (msgpack) {
+        const on = socket.on.bind(socket);
+        const off = socket.off.bind(socket);
+        const wrappers = new WeakMap();  // handler -> Map(event -> decoding wrapper)
+        socket.on = (event, handler) => {
+            const wrapper = (...args) => handler(...args.map(decodePayload));
+            if (!wrappers.has(handler)) wrappers.set(handler, new Map());
+            wrappers.get(handler).set(event, wrapper);
+            return on(event, wrapper);
+        };
+        socket.off = (...args) => {
+            // off(), off(event) and off(event, handler) as in socket.io
+            if (args.length > 1) {
+                const byEvent = wrappers.get(args[1]);
+                if (byEvent && byEvent.has(args[0])) {
+                    args[1] = byEvent.get(args[0]);
+                    byEvent.delete(args[0]);
+                }
+            }
+            return off(...args);
+        };
+    }
+    return socket;
+}
@@ -0,0 +1,67 @@
+"""
+Zone map loading and changed-range pushes of the frame buffer (led_controller).
+
+    python3 -m pytest test_frame_buffer.py
+"""
+
+import json
+
+import pytest
+
+import led_backends
+import led_controller
+import sequence_codec
+from led_controller import FrameBuffer
+
+
+def write_map(tmp_path, zones):
+    path = tmp_path / 'zones.json'
+    path.write_text(json.dumps({'zones': zones}))
+    return str(path)
+
+
+def test_shipped_zone_map_covers_both_strips():
+    zones = led_controller.load_zone_map(led_controller.ZONE_MAP_PATH, 120)
+    assert set(zones) >= set(sequence_codec.PALETTE)
+    leds = sorted(i for runs in zones.values() for start, end in runs for i in range(start, end))
+    assert leds == list(range(120))
+
+
+def test_segments_are_sorted_and_merged(tmp_path):
+    path = write_map(tmp_path, {'red': [[10, 20], [0, 10], [15, 25]], 'yellow': [[30, 31]],
+                                'blue': [[40, 50]], 'green': [[50, 60]]})
+    assert led_controller.load_zone_map(path, 60)['red'] == ((0, 25),)
+
+
+def test_bad_zone_maps(tmp_path):
+    with pytest.raises(ValueError):
+        led_controller.load_zone_map(write_map(tmp_path, {'red': [[0, 61]], 'yellow': [[0, 1]],
+                                                          'blue': [[1, 2]], 'green': [[2, 3]]}), 60)
+    with pytest.raises(ValueError):
+        led_controller.load_zone_map(write_map(tmp_path, {'red': [[0, 10]]}), 60)
+
+
+def test_dirty_range_is_rounded_to_chunks():
+    buffer = FrameBuffer(120)
+    assert buffer.dirty_range() is None
+    # Chunks count from the start for the start and from the end for the end
+    buffer.fill(20, 22, 0xff0000)
+    assert buffer.dirty_range() == (16, 24)
+    buffer.fill(100, 101, 0xff)
+    assert buffer.dirty_range() == (16, 104)
+
+
+def test_push_writes_only_changes_and_skips_repeats():
+    buffer = FrameBuffer(120)
+    strip = led_backends.SimulatorStrip(120)
+    # The first push to a strip writes the whole frame
+    assert buffer.push(strip)
+    assert buffer.pixels_written == 120
+    assert not buffer.push(strip)
+    assert buffer.skipped_pushes == 1
+
+    buffer.fill(60, 64, 0x00ff00)
+    assert buffer.push(strip)
+    assert buffer.pixels_written == 120 + (72 - 48)
+    assert list(strip.pixels[60:64]) == [0x00ff00] * 4
+    assert strip.show_count == 2
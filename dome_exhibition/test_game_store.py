@@ -0,0 +1,60 @@
+"""
+Write-behind batching and the leaderboard queries of the game store (game_store).
+
+    python3 -m pytest test_game_store.py
+"""
+
+import pytest
+
+from game_store import GameStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = GameStore(str(tmp_path / 'dome.sqlite3'), batch_interval=0.2)
+    store.start()
+    yield store
+    store.close()
+
+
+def test_writes_are_committed_in_batches(store):
+    store.start_game('g1', 'single')
+    for level in range(1, 6):
+        store.record_round('g1', 'alice', level, True, level * 20)
+    store.end_game('g1', {'alice': (100, 5)})
+    assert store.flush()
+    stats = store.stats()
+    assert stats['written'] == 7
+    assert stats['batches'] < stats['written']
+    assert stats['queued'] == 0
+
+
+def test_top_players_keep_their_best_game(store):
+    for key, results in (('g1', {'alice': (40, 2), 'bob': (60, 3)}),
+                         ('g2', {'alice': (90, 4)}),
+                         ('g3', {'alice': (20, 1)})):
+        store.start_game(key, 'multi', room='r')
+        store.end_game(key, results)
+    store.flush()
+    assert store.top_players() == [
+        {'username': 'alice', 'score': 90, 'level': 4, 'games': 3},
+        {'username': 'bob', 'score': 60, 'level': 3, 'games': 1}]
+    assert [r['score'] for r in store.top_results(limit=2)] == [90, 60]
+
+
+def test_games_without_a_key_are_not_stored(store):
+    store.record_round(None, 'alice', 1, True, 20)
+    store.end_game(None, {'alice': (20, 1)})
+    store.flush()
+    assert store.stats()['written'] == 0
+    assert store.top_players() == []
+
+
+def test_close_commits_what_is_queued(tmp_path):
+    path = str(tmp_path / 'dome.sqlite3')
+    store = GameStore(path, batch_interval=60)
+    store.start()
+    store.start_game('g1', 'single')
+    store.end_game('g1', {'carol': (30, 1)})
+    store.close()
+    assert GameStore(path).top_players() == [{'username': 'carol', 'score': 30, 'level': 1, 'games': 1}]
@@ -0,0 +1,65 @@
+"""
+Top-K leaderboard updates, eviction and coalesced diffs (leaderboard).
+
+    python3 -m pytest test_leaderboard.py
+"""
+
+from leaderboard import Leaderboard
+
+
+def test_keeps_best_scores_in_order():
+    board = Leaderboard(size=3)
+    assert board.update('a', 10)
+    assert board.update('b', 30)
+    assert board.update('c', 20)
+    # A lower score never replaces a best score
+    assert not board.update('b', 5)
+    assert board.top() == [('b', 30), ('c', 20), ('a', 10)]
+
+
+def test_ties_keep_whoever_was_first():
+    board = Leaderboard(size=3)
+    board.update('first', 10)
+    board.update('second', 10)
+    assert board.top() == [('first', 10), ('second', 10)]
+
+
+def test_eviction():
+    board = Leaderboard(size=2)
+    board.update('a', 10)
+    board.update('b', 20)
+    assert not board.update('c', 10)
+    assert board.update('c', 15)
+    assert board.top() == [('b', 20), ('c', 15)]
+    # 'a' dropped out and comes back only with a place-worthy score
+    assert board.update('a', 30)
+    assert board.top() == [('a', 30), ('b', 20)]
+
+
+def test_diffs_chain_and_coalesce():
+    board = Leaderboard(size=3)
+    assert board.take_diff() is None
+    board.update('a', 10)
+    board.update('b', 20)
+    first = board.take_diff()
+    assert first == {'base': 0, 'version': 2, 'length': 2,
+                     'changed': [[0, 'b', 20], [1, 'a', 10]]}
+    assert board.take_diff() is None
+
+    board.update('c', 15)
+    board.update('a', 25)
+    second = board.take_diff()
+    assert second['base'] == first['version']
+    assert second['length'] == 3
+    assert second['changed'] == [[0, 'a', 25], [1, 'b', 20], [2, 'c', 15]]
+
+
+def test_snapshot_is_the_last_pushed_board():
+    board = Leaderboard(size=3)
+    board.load([{'username': 'a', 'score': 50}, {'username': 'b', 'score': 40}])
+    board.update('c', 60)
+    snapshot = board.snapshot()
+    assert snapshot['players'] == [{'username': 'a', 'score': 50}, {'username': 'b', 'score': 40}]
+    diff = board.take_diff()
+    assert diff['base'] == snapshot['version']
+    assert diff['changed'] == [[0, 'c', 60], [1, 'a', 50], [2, 'b', 40]]
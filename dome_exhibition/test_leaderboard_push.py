@@ -0,0 +1,50 @@
+"""
+The leaderboard push task keeps sending diffs to watchers, cycle after cycle.
+Needs the server dependencies (Flask-SocketIO):
+
+    python3 -m pytest test_leaderboard_push.py
+"""
+
+import time
+
+import pytest
+
+pytest.importorskip('flask_socketio')
+
+
+@pytest.fixture(scope='module')
+def server():
+    # conftest.py points the store at a temporary file
+    import leaderboard
+    # Set before app starts push_leaderboard, which reads it every cycle
+    leaderboard.PUSH_INTERVAL = 0.05
+    import app
+    app.start_services()
+    return app
+
+
+def wait_for_diffs(client, count, timeout=2.0):
+    diffs = []
+    deadline = time.monotonic() + timeout
+    while len(diffs) < count and time.monotonic() < deadline:
+        diffs += [message['args'][0] for message in client.get_received()
+                  if message['name'] == 'leaderboard_diff']
+        time.sleep(0.01)
+    return diffs
+
+
+def test_push_runs_several_cycles(server):
+    client = server.socketio.test_client(server.app)
+    snapshot = client.emit('watch_leaderboard', callback=True)
+    version = snapshot['version']
+
+    server.board.update('push_test_a', 1000000)
+    first = wait_for_diffs(client, 1)
+    server.board.update('push_test_b', 2000000)
+    second = wait_for_diffs(client, 1)
+
+    assert len(first) == 1 and len(second) == 1
+    assert first[0]['base'] == version
+    assert second[0]['base'] == first[0]['version']
+    assert second[0]['changed'][0] == [0, 'push_test_b', 2000000]
+    client.disconnect()
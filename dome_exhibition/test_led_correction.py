@@ -0,0 +1,48 @@
+"""
+Gamma, brightness and the current limit of pushed frames (led_correction).
+
+    python3 -m pytest test_led_correction.py
+"""
+
+import random
+from array import array
+
+import led_correction
+from led_correction import OutputCorrection
+
+
+def frame(colors):
+    return array('I', colors)
+
+
+def test_limit_tables_never_round_up():
+    for level in range(256):
+        table = led_correction.LIMIT_TABLES[level]
+        assert all(table[value] * 255 <= value * level for value in range(256))
+    assert led_correction.LIMIT_TABLES[255] == bytes(range(256))
+
+
+def test_brightness_and_gamma():
+    correction = OutputCorrection(brightness=255, gamma=1.0, max_current_ma=0)
+    assert list(correction.apply(frame([0x00ff8000]))) == [0x00ff8000]
+    assert correction.set_brightness(300) == 255
+    correction.set_brightness(0)
+    assert list(correction.apply(frame([0x00ffffff]))) == [0]
+
+
+def test_frames_stay_within_the_current_budget():
+    rng = random.Random(2)
+    correction = OutputCorrection(brightness=255, gamma=1.0, max_current_ma=2000)
+    for _ in range(200):
+        pixels = frame([rng.getrandbits(24) for _ in range(120)])
+        correction.apply(pixels)
+        assert correction.last_current_ma <= correction.max_current_ma
+    assert correction.limited_frames > 0
+    assert correction.peak_current_ma <= correction.max_current_ma
+
+
+def test_frames_within_the_budget_are_untouched():
+    correction = OutputCorrection(brightness=255, gamma=1.0, max_current_ma=4000)
+    pixels = frame([0x000000ff] * 120)
+    assert correction.apply(pixels) == pixels
+    assert correction.limited_frames == 0
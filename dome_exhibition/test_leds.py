@@ -2,12 +2,23 @@
 """
 LED hardware test script
 Used to verify whether the connections of 120 LED light strips are correct
+
+Off the Pi it runs against the simulator backend; pass --capture FILE to
+save every frame that was shown, for checking timing and colours.
 """
 
+import argparse
 import time
+import dome_logging
+import led_backends
 import led_controller
 
 def main():
+    parser = argparse.ArgumentParser(description="LED hardware test")
+    parser.add_argument('--capture', help="write the simulator frames to this file")
+    args = parser.parse_args()
+    dome_logging.setup_logging(log_format='text')
+
     print("=== LED hardware testing program ===")
     print("This program will test all 120 LED light strips")
     print("Press Ctrl+C to stop the test")
@@ -37,6 +48,12 @@ def main():
         led_controller.turn_off_all_leds()
         
         print("Test completed!")
+
+        if isinstance(led_controller.strip, led_backends.SimulatorStrip):
+            print(f"Simulator capture: {led_controller.strip.stats()}")
+            if args.capture:
+                led_controller.strip.dump(args.capture)
+                print(f"Frames written to {args.capture}")
         
     except KeyboardInterrupt:
         print("The test was interrupted by the user")
@@ -0,0 +1,85 @@
+"""
+Room updates merged into room_batch diffs (room_batch).
+
+    python3 -m pytest test_room_batch.py
+"""
+
+from room_batch import RoomBatcher
+
+
+class FakeSocketIO:
+    def __init__(self):
+        self.emitted = []
+        self.tasks = []
+
+    def emit(self, event, data, to=None):
+        self.emitted.append((event, data, to))
+
+    def start_background_task(self, target):
+        # The flusher is not run; the tests flush by hand
+        self.tasks.append(target)
+
+
+def player(ready=False, score=0):
+    return {'ready': ready, 'score': score}
+
+
+def test_updates_in_a_window_make_one_diff():
+    socketio = FakeSocketIO()
+    batcher = RoomBatcher(socketio, window=60)
+    batcher.players('r', {'a': player()}, 'a')
+    batcher.players('r', {'a': player(), 'b': player()}, 'a')
+    batcher.message('r', 'Waiting...')
+    assert batcher.pending('r')
+    assert len(socketio.tasks) == 1
+
+    batcher.flush('r')
+    assert not batcher.pending('r')
+    assert socketio.emitted == [('room_batch', {
+        'players': {'a': {'ready': False, 'score': 0}, 'b': {'ready': False, 'score': 0}},
+        'host': 'a',
+        'message': 'Waiting...'
+    }, 'r')]
+
+
+def test_only_changes_and_removals_are_sent():
+    socketio = FakeSocketIO()
+    batcher = RoomBatcher(socketio, window=60)
+    batcher.players('r', {'a': player(), 'b': player()}, 'a')
+    batcher.flush('r')
+    batcher.players('r', {'b': player(ready=True)}, 'b')
+    batcher.flush('r')
+    assert socketio.emitted[-1] == ('room_batch', {
+        'players': {'b': {'ready': True, 'score': 0}},
+        'removed': ['a'],
+        'host': 'b'
+    }, 'r')
+    # Nothing changed: nothing is sent
+    batcher.players('r', {'b': player(ready=True)}, 'b')
+    batcher.flush('r')
+    assert len(socketio.emitted) == 2
+
+
+def test_forget_starts_the_room_over():
+    socketio = FakeSocketIO()
+    batcher = RoomBatcher(socketio, window=60)
+    batcher.players('r', {'a': player()}, 'a')
+    batcher.flush('r')
+    batcher.players('r', {'a': player(score=20)}, 'a')
+    batcher.forget('r')
+    assert not batcher.pending('r')
+    batcher.flush('r')
+    assert len(socketio.emitted) == 1
+    # A new room of the same name gets the full list again
+    batcher.players('r', {'a': player()}, 'a')
+    batcher.flush('r')
+    assert socketio.emitted[-1][1] == {'players': {'a': {'ready': False, 'score': 0}}, 'host': 'a'}
+
+
+def test_window_zero_sends_the_old_events():
+    socketio = FakeSocketIO()
+    batcher = RoomBatcher(socketio, window=0)
+    batcher.players('r', {'a': player()}, 'a')
+    batcher.message('r', 'Observe the light!')
+    assert [event for event, _, _ in socketio.emitted] == ['update_players', 'write_messageBox']
+    assert not batcher.pending('r')
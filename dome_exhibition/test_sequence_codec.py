@@ -0,0 +1,51 @@
+"""
+Packing colour sequences into ints and back (sequence_codec).
+
+    python3 -m pytest test_sequence_codec.py
+"""
+
+import random
+
+import pytest
+
+import sequence_codec
+
+
+def test_round_trip_every_length():
+    rng = random.Random(1)
+    for size in range(0, 21):
+        sequence = [rng.choice(sequence_codec.PALETTE) for _ in range(size)]
+        code = sequence_codec.encode(sequence)
+        assert sequence_codec.length(code) == size
+        assert sequence_codec.decode(code) == sequence
+
+
+def test_layout_and_empty():
+    # First colour in the lowest bits, sentinel above the last
+    assert sequence_codec.encode(['red', 'blue']) == 0b11000
+    assert sequence_codec.encode([]) == sequence_codec.EMPTY_CODE
+    assert sequence_codec.decode(sequence_codec.EMPTY_CODE) == []
+
+
+def test_unknown_colour():
+    with pytest.raises(ValueError):
+        sequence_codec.encode(['red', 'purple'])
+
+
+def test_to_code_accepts_old_and_new_answers():
+    code = sequence_codec.encode(['green', 'yellow'])
+    assert sequence_codec.to_code(code) == code
+    assert sequence_codec.to_code(['green', 'yellow']) == code
+    assert sequence_codec.to_code(['green', 7]) is None
+    assert sequence_codec.to_code(True) is None
+    assert sequence_codec.to_code(0) is None
+    assert sequence_codec.to_code('green') is None
+
+
+def test_first_mismatch():
+    target = sequence_codec.encode(['red', 'blue', 'green'])
+    assert sequence_codec.first_mismatch(target, target) == -1
+    assert sequence_codec.first_mismatch(sequence_codec.encode(['red', 'yellow', 'green']), target) == 1
+    # A prefix is wrong at its end
+    assert sequence_codec.first_mismatch(sequence_codec.encode(['red', 'blue']), target) == 2
+    assert sequence_codec.first_mismatch(None, target) == 0
@@ -0,0 +1,59 @@
+"""
+Per-client JSON / msgpack routing of emits (wire_format).
+
+    python3 -m pytest test_wire_format.py
+"""
+
+import pytest
+
+import wire_format
+from wire_format import WireFormat
+
+msgpack = pytest.importorskip('msgpack')
+
+BIG = {'players': {f'player_{i}': {'ready': True, 'score': i * 10} for i in range(8)}, 'host': 'player_0'}
+SMALL = {'players': {'a': {'ready': True, 'score': 0}}}
+
+
+def wire_with_clients():
+    wire = WireFormat(enabled=True)
+    assert wire.negotiate('binary_sid', {'msgpack': True})
+    assert not wire.negotiate('json_sid', None)
+    assert wire.room_for('binary_sid', 'r') == 'r' + wire_format.BINARY_ROOM_SUFFIX
+    assert wire.room_for('json_sid', 'r') == 'r'
+    return wire
+
+
+def test_rooms_go_to_both_twins():
+    wire = wire_with_clients()
+    (room, json_payload), (twin, packed) = wire.routes('update_players', 'r', BIG)
+    assert (room, json_payload) == ('r', BIG)
+    assert twin == 'r#msgpack'
+    assert msgpack.unpackb(packed) == BIG
+    # Events that are never packed still reach the twin, as JSON
+    assert wire.routes('write_messageBox', 'r', {'message': 'hi'}) == [
+        ('r', {'message': 'hi'}), ('r#msgpack', {'message': 'hi'})]
+
+
+def test_small_payloads_stay_json():
+    wire = wire_with_clients()
+    assert wire.routes('update_players', 'binary_sid', SMALL) == [('binary_sid', SMALL)]
+    assert isinstance(wire.routes('update_players', 'binary_sid', BIG)[0][1], bytes)
+
+
+def test_json_clients_and_broadcasts_are_untouched():
+    wire = wire_with_clients()
+    assert wire.routes('update_players', 'json_sid', BIG) == [('json_sid', BIG)]
+    assert wire.routes('update_players', 'other_room', BIG) == [('other_room', BIG)]
+    assert wire.routes('update_players', None, BIG) == [(None, BIG)]
+
+
+def test_disabled_or_forgotten():
+    wire = WireFormat(enabled=False)
+    assert not wire.negotiate('sid', {'msgpack': True})
+    assert wire.room_for('sid', 'r') == 'r'
+
+    wire = wire_with_clients()
+    wire.forget('binary_sid')
+    assert wire.close_room('r') == 'r#msgpack'
+    assert wire.close_room('r') is None
@@ -0,0 +1,89 @@
+import logging
+import os
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+log = logging.getLogger('wire_format')
+
+# --- Wire Format Configuration ---
+# Phones that load static/js/dome_wire.js with the MessagePack decoder ask
+# for msgpack when they connect; everyone else keeps getting JSON.
+# DOME_MSGPACK=0 turns it off even when the msgpack package is installed.
+MSGPACK_ENABLED = msgpack is not None and os.environ.get('DOME_MSGPACK', '1') != '0'
+# Events that can be worth packing: player lists, sequences and timelines
+BINARY_EVENTS = frozenset(('update_players', 'room_batch', 'game_started', 'sequence_playing', 'game_over'))
+# A packed payload travels as a placeholder packet plus a binary frame, so
+# small ones get bigger on the wire. At 160 packed bytes and up the pair is
+# at least 48 bytes smaller than the single JSON frame (e.g. sequence_playing
+# from level 4, player lists of 8); below it the client gets JSON.
+MSGPACK_MIN_BYTES = 160
+BINARY_ROOM_SUFFIX = '#msgpack'
+
+
+class WireFormat:
+    """
+    Per-client choice between JSON and msgpack payloads.
+    The Socket.IO parser is the same for every client, so old pages keep
+    working: a client that negotiated msgpack gets the payload of the
+    BINARY_EVENTS as one msgpack-encoded binary attachment instead of a
+    JSON object. Such clients join '<room>#msgpack' instead of '<room>', and
+    every emit to a room is sent to both: its twin gets the packed payload
+    for BINARY_EVENTS and the same JSON as the room for everything else.
+    """
+
+    def __init__(self, enabled=MSGPACK_ENABLED):
+        self.enabled = enabled
+        self.binary_sids = set()
+        self.binary_rooms = set()
+
+    def negotiate(self, sid, auth):
+        """Called on connect with the client's auth data; True if it gets msgpack."""
+        if self.enabled and isinstance(auth, dict) and auth.get('msgpack'):
+            self.binary_sids.add(sid)
+            return True
+        return False
+
+    def forget(self, sid):
+        self.binary_sids.discard(sid)
+
+    def room_for(self, sid, room):
+        """Socket room the client should join for a game room."""
+        if sid in self.binary_sids:
+            self.binary_rooms.add(room)
+            return room + BINARY_ROOM_SUFFIX
+        return room
+
+    def close_room(self, room):
+        """Forget the room; returns its msgpack twin to close as well, or None."""
+        if room in self.binary_rooms:
+            self.binary_rooms.discard(room)
+            return room + BINARY_ROOM_SUFFIX
+        return None
+
+    def routes(self, event, to, data):
+        """
+        [(to, payload)] to emit instead of (to, data): the payload as a
+        msgpack client gets it, or for a room the JSON payload plus the
+        copy for its twin room. (to, data) unchanged for everything else.
+        """
+        if not self.binary_sids or to is None:
+            return [(to, data)]
+        if to in self.binary_sids:
+            return [(to, self.pack(event, data))]
+        if to in self.binary_rooms:
+            return [(to, data), (to + BINARY_ROOM_SUFFIX, self.pack(event, data))]
+        return [(to, data)]
+
+    def pack(self, event, data):
+        """Payload for a msgpack client: packed for big BINARY_EVENTS, JSON otherwise."""
+        if event not in BINARY_EVENTS:
+            return data
+        packed = self.encode(data)
+        return packed if len(packed) >= MSGPACK_MIN_BYTES else data
+
+    @staticmethod
+    def encode(data):
+        return msgpack.packb(data, use_bin_type=True)